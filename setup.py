@@ -11,13 +11,16 @@ setup(
     keywords = 'zabbix api',
     url = 'http://github.com/erik-stephens/zabbix',
     packages = ['zabbix', 'zabbix.objects', 'tests'],
+    python_requires = '>=3.6',
     long_description = open('README.rst').read(),
     classifiers = [
         'Development Status :: 3 - Alpha',
         'Topic :: Utilities',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
         'License :: OSI Approved :: MIT License',
     ],
 )
@@ -5,7 +5,7 @@ from contextlib import contextmanager
 from functools import partial
 from datetime import datetime
 import json
-from zabbix import Api, ApiException, Host, HostGroup
+from zabbix import Api, ApiException, Host, HostGroup, Item, save_all
 
 
 @contextmanager
@@ -32,7 +32,33 @@ def mock_reply(session, **fields):
     """
     fields['jsonrpc'] = '2.0'
     fields['id'] = 0
-    session.post.return_value = Mock(text=json.dumps(fields))
+    text = json.dumps(fields)
+    session.post.return_value = Mock(text=text, content=text.encode('utf-8'))
+
+
+def mock_methods(api, **handlers):
+    """
+    Mock session.post() to answer each method with the result of its
+    handler (called with the request params), ie:
+
+        mock_methods(api, host_get=lambda params: [...])
+
+    A handler raising `ApiException` answers with that error.  Return
+    the list of requests made.
+    """
+    requests = []
+    def post(endpoint, data):
+        request = json.loads(data)
+        requests.append(request)
+        reply = dict(jsonrpc='2.0', id=request['id'])
+        try:
+            reply['result'] = handlers[request['method'].replace('.', '_')](request['params'])
+        except ApiException as e:
+            reply['error'] = dict(code=e.code, message=e.msg, data=e.data)
+        text = json.dumps(reply)
+        return Mock(text=text, content=text.encode('utf-8'))
+    api._session.post.side_effect = post
+    return requests
 
 
 def test_auth1():
@@ -82,3 +108,93 @@ def test_id1():
         api.mock_reply(result=[{"groupid":"45","name":"MyGroup","internal":"0","flags":"0"}])
         grp = HostGroup.by_name(api, 'MyGroup')
         assert grp.id == '45'
+
+
+def test_dirty1():
+    'Only modified properties are dirty.'
+    with api_session() as api:
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost","status":"0"}])
+        host = Host.by_name(api, 'MyHost')
+        assert not host.status.dirty
+        host.status.val = 1
+        assert host.status.val == 1
+        assert host.status.dirty
+        assert not host.name.dirty
+
+
+def test_missing1():
+    'Properties not in the reply are not attributes of the object.'
+    with api_session() as api:
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost"}])
+        host = Host.by_name(api, 'MyHost')
+        assert not hasattr(host, 'status')
+        assert Host.status.kind == int
+
+
+def test_doc1():
+    'Properties are documented by their doc.'
+    with api_session() as api:
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost"}])
+        host = Host.by_name(api, 'MyHost')
+        assert host.name.__doc__ == Host.name.__doc__ == Host.PROPS['name']['doc']
+        assert 'wrapped' in host.name.__class__.__doc__
+
+
+def test_trusted1():
+    'Server data is only converted, user assignments are validated.'
+    with api_session() as api:
+        api.mock_reply(result=[{"groupid":"45","name":"MyGroup","internal":"7","flags":"0"}])
+        grp = HostGroup.by_name(api, 'MyGroup')
+        assert grp.internal.val == 7
+        with assert_raises(ApiException):
+            grp.flags.val = 7
+
+
+def test_trusted2():
+    'Server data is validated when api.validate_replies is set.'
+    with api_session() as api:
+        api.validate_replies = True
+        api.mock_reply(result=[{"groupid":"45","name":"MyGroup","internal":"7","flags":"0"}])
+        with assert_raises(ApiException):
+            HostGroup.by_name(api, 'MyGroup')
+
+
+def test_save1():
+    'Only dirty properties are sent, and are clean once confirmed.'
+    with api_session() as api:
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost","status":"0"}])
+        host = Host.by_name(api, 'MyHost')
+        assert not host.save()
+        host.status.val = 1
+        api.mock_reply(result={"hostids": ["45"]})
+        assert host.save()
+        request = json.loads(api._session.post.call_args[1]['data'])
+        assert request['method'] == 'host.update'
+        assert request['params'] == [{"hostid": "45", "status": 1}]
+        assert not host.status.dirty
+
+
+def test_save2():
+    'Dirty flags stay set when the server does not confirm.'
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', status=0)
+        item.status.val = 1
+        api.mock_reply(result={"itemids": []})
+        assert not item.save()
+        assert item.status.dirty
+
+
+def test_save_all1():
+    'Objects sharing the same changes are sent as one massupdate.'
+    with api_session() as api:
+        hosts = [Host(api, hostid=str(i), name='host' + str(i), status=0) for i in range(4)]
+        for host in hosts[:3]:
+            host.status.val = 1
+        hosts[3].name.val = 'renamed'
+        requests = mock_methods(api,
+            host_massupdate = lambda params: dict(hostids=[h['hostid'] for h in params['hosts']]),
+            host_update = lambda params: dict(hostids=[h['hostid'] for h in params]),
+        )
+        assert len(save_all(hosts)) == 4
+        assert sorted(r['method'] for r in requests) == ['host.massupdate', 'host.update']
+        assert not any(h.status.dirty or h.name.dirty for h in hosts)
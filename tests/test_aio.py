@@ -0,0 +1,108 @@
+import asyncio
+import json
+from nose.tools import assert_raises
+from zabbix import ApiException, Host, Item
+from zabbix.aio import AsyncApi, by_name, items, get_history
+
+
+class MockResponse(object):
+
+    def __init__(I, session, text):
+        I._session = session
+        I._text = text
+
+    async def __aenter__(I):
+        I._session.inflight += 1
+        I._session.peak = max(I._session.peak, I._session.inflight)
+        return I
+
+    async def __aexit__(I, *exc):
+        I._session.inflight -= 1
+
+    async def read(I):
+        await asyncio.sleep(0)
+        return I._text.encode('utf-8')
+
+
+class MockSession(object):
+    """
+    Answer each post() with the next of `replies`, tracking how many
+    requests are in flight at once.
+    """
+
+    def __init__(I, *replies):
+        I.replies = list(replies)
+        I.requests = []
+        I.inflight = 0
+        I.peak = 0
+
+    def post(I, endpoint, data):
+        I.requests.append(json.loads(data))
+        fields = dict(I.replies.pop(0))
+        fields['jsonrpc'] = '2.0'
+        fields['id'] = I.requests[-1]['id']
+        return MockResponse(I, json.dumps(fields))
+
+    async def close(I):
+        pass
+
+
+def run(coro):
+    # Like asyncio.run, which Python 3.6 lacks.
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_auth1():
+    'Return true when auth succeeds.'
+    api = AsyncApi('http://zabbix', MockSession(dict(result='36fc69043640c433c0010773499b44af')))
+    assert run(api.login('foo', 'bar'))
+
+
+def test_auth2():
+    'Return false when auth fails.'
+    api = AsyncApi('http://zabbix', MockSession(
+        dict(error={"code":-32602,"message":"Invalid params.","data":"Login name or password is incorrect."})))
+    assert not run(api.login('foo', 'bar'))
+
+
+def test_error1():
+    'Errors in the reply raise ApiException.'
+    api = AsyncApi('http://zabbix', MockSession(
+        dict(error={"code":-32500,"message":"Application error.","data":"No permissions."})))
+    with assert_raises(ApiException) as cm:
+        run(api.response('host.get'))
+    assert cm.exception.code == -32500
+
+
+def test_lookups1():
+    'Awaitable lookups build the same objects as the blocking ones.'
+    session = MockSession(
+        dict(result=[{"hostid":"45","name":"MyHost"}]),
+        dict(result=[{"itemid":"1","key_":"Memory","value_type":"3"}]),
+    )
+    api = AsyncApi('http://zabbix', session)
+    async def lookup():
+        host = await by_name(Host, api, 'MyHost')
+        return host, await items(host)
+    host, host_items = run(lookup())
+    assert host.id == '45'
+    assert 'Memory' in host_items
+    assert host.items is host_items
+    assert session.requests[1]['params']['hostids'] == '45'
+
+
+def test_history1():
+    'History pulls can run concurrently, from one loop after another.'
+    replies = [dict(result=[{"itemid": "1", "ns": "0", "value": "2", "clock": "1391709315"}])] * 10
+    session = MockSession(*replies)
+    api = AsyncApi('http://zabbix', session, limit=2)
+    item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT)
+    async def pull():
+        return await asyncio.gather(*[get_history(item) for i in range(5)])
+    assert [[('1391709315', 2)]] * 5 == run(pull())
+    assert session.peak == 2
+    assert [[('1391709315', 2)]] * 5 == run(pull())
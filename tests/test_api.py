@@ -0,0 +1,202 @@
+from nose.tools import assert_raises
+from mock import Mock
+import json
+import time
+import threading
+from zabbix import ApiException, Batch, BatchCall, Metrics
+from . import api_session, mock_methods
+
+
+def mock_batch_reply(api, results):
+    """
+    Mock session.post() to answer a batch request, taking each reply's
+    result (or error when it is an `ApiException`) from `results` by method.
+    """
+    def post(endpoint, data):
+        reply = []
+        for call in reversed(json.loads(data)):
+            res = results[call['method']]
+            item = dict(jsonrpc='2.0', id=call['id'])
+            if isinstance(res, ApiException):
+                item['error'] = dict(code=res.code, message=res.msg, data=res.data)
+            else:
+                item['result'] = res
+            reply.append(item)
+        text = json.dumps(reply)
+        return Mock(text=text, content=text.encode('utf-8'))
+    api._session.post.side_effect = post
+
+
+def test_batch1():
+    'Batched calls are sent together and matched back by id.'
+    with api_session() as api:
+        mock_batch_reply(api, {
+            'host.get': [{"hostid": "45"}],
+            'hostgroup.get': [{"groupid": "14"}],
+        })
+        with api.batch() as batch:
+            hosts = batch.response('host.get', filter=dict(name='MyHost'))
+            groups = batch.response('hostgroup.get', filter=dict(name='MyGroup'))
+            assert isinstance(batch, Batch) and isinstance(hosts, BatchCall)
+            assert not hosts.done
+        assert api._session.post.call_count == 2 # login + batch
+        assert hosts.result == [{"hostid": "45"}]
+        assert groups.result == [{"groupid": "14"}]
+
+
+def test_batch2():
+    'Batches are capped at `size` calls.'
+    with api_session() as api:
+        mock_batch_reply(api, {'host.get': []})
+        with api.batch(size=2) as batch:
+            calls = [batch.response('host.get') for i in range(5)]
+        assert api._session.post.call_count == 4 # login + 3 batches
+        assert all(call.result == [] for call in calls)
+
+
+def test_batch3():
+    'Each batched call raises its own error.'
+    with api_session() as api:
+        mock_batch_reply(api, {
+            'host.get': [],
+            'host.update': ApiException(-32602, 'Invalid params.', 'No permissions.'),
+        })
+        with api.batch() as batch:
+            ok = batch.response('host.get')
+            bad = batch.response('host.update', hostid='45')
+        assert ok.result == []
+        with assert_raises(ApiException) as cm:
+            bad.result
+        assert cm.exception.code == -32602
+
+
+def test_batch4():
+    'A batch reply holding something else than reply objects is invalid.'
+    with api_session() as api:
+        api.mock_reply(result=[])
+        api._session.post.return_value.content = b'[1, 2]'
+        with assert_raises(ApiException) as cm:
+            with api.batch() as batch:
+                batch.response('host.get')
+        assert cm.exception.code == ApiException.INVALID_REPLY
+
+
+def test_measure1():
+    'Calls made within measure() are counted per method.'
+    with api_session() as api:
+        api.mock_reply(result=[{"hostid": "45"}])
+        with api.measure() as metrics:
+            api.response('host.get')
+            api.response('host.get')
+        api.response('host.get')
+        snap = metrics.snapshot()
+        assert list(snap) == ['host.get']
+        assert snap['host.get']['calls'] == 2
+        assert snap['host.get']['errors'] == 0
+        assert sum(snap['host.get']['histogram'].values()) == 2
+        assert snap['host.get']['response_bytes'] > 0
+        assert snap['host.get']['request_bytes'] > 0
+
+
+def test_measure2():
+    'Errors are counted per method and code.'
+    with api_session() as api:
+        metrics = api.instrument(Metrics())
+        api.mock_reply(error={"code":-32500,"message":"Application error.","data":""})
+        with assert_raises(ApiException):
+            api.response('item.get')
+        snap = metrics.snapshot()
+        assert snap['item.get']['errors'] == 1
+        assert snap['item.get']['error_codes'] == {-32500: 1}
+
+
+def test_measure3():
+    'measure() only counts the calls of its own thread.'
+    with api_session() as api:
+        mock_methods(api, host_get=lambda params: [], item_get=lambda params: [])
+        with api.measure() as metrics:
+            api.response('host.get')
+            thread = threading.Thread(target=api.response, args=('item.get',))
+            thread.start()
+            thread.join()
+        assert list(metrics.snapshot()) == ['host.get']
+
+
+def mock_slow_history(api):
+    """
+    Answer history.get with its itemids after a delay decreasing with the
+    itemid, failing for itemid 0.  Return the list of requests made.
+    """
+    def history_get(params):
+        time.sleep(0.01 * (5 - int(params['itemids'])))
+        if params['itemids'] == '0':
+            raise ApiException(-32500, 'Application error.', 'No item.')
+        return [params['itemids']]
+    return mock_methods(api, history_get=history_get)
+
+
+def test_map1():
+    'Calls are run concurrently and returned in order, with their own errors.'
+    with api_session() as api:
+        requests = mock_slow_history(api)
+        calls = api.map(('history.get', dict(itemids=str(i))) for i in range(5))
+        calls = list(calls)
+        assert [call.result for call in calls[1:]] == [['1'], ['2'], ['3'], ['4']]
+        with assert_raises(ApiException) as cm:
+            calls[0].result
+        assert cm.exception.code == -32500
+        assert len(set(request['id'] for request in requests)) == 5
+
+
+def test_map2():
+    'Unordered calls come back as they complete.'
+    with api_session() as api:
+        release = threading.Event()
+        def history_get(params):
+            if params['itemids'] == '1':
+                release.wait(5)
+            return [params['itemids']]
+        mock_methods(api, history_get=history_get)
+        calls = api.map([('history.get', dict(itemids=str(i))) for i in (1, 2)], ordered=False)
+        assert next(calls).result == ['2']
+        release.set()
+        assert next(calls).result == ['1']
+
+
+def test_threads1():
+    'Request ids stay unique when an Api is shared between threads.'
+    with api_session() as api:
+        requests = mock_methods(api, host_get=lambda params: [])
+        metrics = api.instrument(Metrics())
+        def run():
+            for i in range(200):
+                api.response('host.get')
+        threads = [threading.Thread(target=run) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(request['id'] for request in requests)) == 800
+        assert metrics.snapshot()['host.get']['calls'] == 800
+
+
+def test_threads2():
+    'Hooks added and removed by other threads do not make calls skip a hook.'
+    with api_session() as api:
+        mock_methods(api, host_get=lambda params: [])
+        metrics = api.instrument(Metrics())
+        done = threading.Event()
+        def churn():
+            while not done.is_set():
+                with api.measure():
+                    pass
+        thread = threading.Thread(target=churn)
+        thread.start()
+        try:
+            for i in range(500):
+                api.response('host.get')
+        finally:
+            done.set()
+            thread.join()
+        assert metrics.snapshot()['host.get']['calls'] == 500
+        assert api._hooks == (metrics,)
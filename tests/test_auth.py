@@ -0,0 +1,155 @@
+import os
+import json
+import shutil
+import tempfile
+from mock import Mock
+from zabbix import ApiException
+from zabbix.auth import FileTokenStore
+from . import api_session, mock_methods
+
+EXPIRED = {"code": -32602, "message": "Invalid params.", "data": "Session terminated, re-login, please."}
+
+
+def tokens():
+    path = tempfile.mkdtemp()
+    return path, FileTokenStore(os.path.join(path, 'tokens'))
+
+
+def test_store1():
+    'Tokens are saved per key in an owner-only file.'
+    path, store = tokens()
+    try:
+        store.set('a', '1')
+        store.set('b', '2')
+        store.delete('a')
+        assert store.get('a') is None
+        assert store.get('b') == '2'
+        assert os.stat(store.path).st_mode & 0o777 == 0o600
+    finally:
+        shutil.rmtree(path)
+
+
+def test_reuse1():
+    'A saved session key is reused without calling user.login.'
+    path, store = tokens()
+    try:
+        with api_session(auth=False) as api:
+            api.tokens = store
+            requests = mock_methods(api, user_login=lambda params: 'token1')
+            assert api.login('user', 'pass')
+            assert len(requests) == 1
+        with api_session(auth=False) as api:
+            api.tokens = store
+            requests = mock_methods(api, user_login=lambda params: 'token2')
+            assert api.login('user', 'pass')
+            assert requests == []
+            assert api._auth == 'token1'
+    finally:
+        shutil.rmtree(path)
+
+
+def mock_expiry(api, stale):
+    """
+    Mock session.post() to answer calls made with session key `stale` as
+    expired, and user.login with 'fresh'.  Return the list of requests.
+    """
+    requests = []
+    def post(endpoint, data):
+        request = json.loads(data)
+        requests.append(request)
+        reply = dict(jsonrpc='2.0', id=request['id'])
+        if request['method'] == 'user.login':
+            reply['result'] = 'fresh'
+        elif request['auth'] == stale:
+            reply['error'] = EXPIRED
+        else:
+            reply['result'] = []
+        text = json.dumps(reply)
+        return Mock(text=text, content=text.encode('utf-8'))
+    api._session.post.side_effect = post
+    return requests
+
+
+def test_expired1():
+    'An expired session key is replaced and the call retried once.'
+    path, store = tokens()
+    try:
+        with api_session(auth=False) as api:
+            api.tokens = store
+            api._credentials = ('user', 'pass')
+            store.set(api._token_key(), 'stale')
+            assert api.login('user', 'pass')
+            requests = mock_expiry(api, 'stale')
+            assert api.response('host.get')['result'] == []
+            assert [r['method'] for r in requests] == ['host.get', 'user.login', 'host.get']
+            assert store.get(api._token_key()) == 'fresh'
+    finally:
+        shutil.rmtree(path)
+
+
+def test_expired2():
+    'A session key renewed by another process is used without logging in.'
+    path, store = tokens()
+    try:
+        with api_session(auth=False) as api:
+            api.tokens = store
+            api._credentials = ('user', 'pass')
+            store.set(api._token_key(), 'stale')
+            assert api.login('user', 'pass')
+            store.set(api._token_key(), 'other')
+            requests = mock_expiry(api, 'stale')
+            assert api.response('host.get')['result'] == []
+            assert [(r['method'], r['auth']) for r in requests] == [('host.get', 'stale'), ('host.get', 'other')]
+            assert store.get(api._token_key()) == 'other'
+    finally:
+        shutil.rmtree(path)
+
+
+def test_expired3():
+    'Stores without renew are read again before logging in.'
+    class Store(dict):
+        def set(I, key, token):
+            I[key] = token
+        def delete(I, key):
+            I.pop(key, None)
+    with api_session(auth=False) as api:
+        api.tokens = store = Store()
+        api._credentials = ('user', 'pass')
+        store.set(api._token_key(), 'stale')
+        assert api.login('user', 'pass')
+        store.set(api._token_key(), 'other')
+        requests = mock_expiry(api, 'stale')
+        assert api.response('host.get')['result'] == []
+        assert [r['auth'] for r in requests] == ['stale', 'other']
+        requests = mock_expiry(api, 'other')
+        assert api.response('host.get')['result'] == []
+        assert [r['method'] for r in requests] == ['host.get', 'user.login', 'host.get']
+        assert store[api._token_key()] == 'fresh'
+
+
+def test_expired4():
+    'Only the errors of an invalid session key are expiry.'
+    assert ApiException(EXPIRED['code'], EXPIRED['message'], EXPIRED['data']).expired
+    assert ApiException(-32602, 'Invalid params.', 'Not authorised.').expired
+    assert not ApiException(-32602, 'Invalid params.', 'Invalid parameter "/1/sessionid": unexpected parameter.').expired
+    assert not ApiException(-32500, 'Application error.', 'Session terminated, re-login, please.').expired
+
+
+def test_password1():
+    'A session key saved for a user is not reused with another password.'
+    path, store = tokens()
+    try:
+        with api_session(auth=False) as api:
+            api.tokens = store
+            mock_methods(api, user_login=lambda params: 'token1')
+            assert api.login('user', 'pass')
+        with api_session(auth=False) as api:
+            api.tokens = store
+            def user_login(params):
+                raise ApiException(-32602, 'Invalid params.', 'Login name or password is incorrect.')
+            requests = mock_methods(api, user_login=user_login)
+            assert not api.login('user', 'wrong')
+            assert len(requests) == 1
+            assert api._auth is None
+    finally:
+        shutil.rmtree(path)
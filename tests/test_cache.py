@@ -0,0 +1,249 @@
+from nose.tools import assert_raises
+import threading
+import time
+from zabbix import ApiException, ObjectCache, ResponseCache, Host, HostGroup, Item
+from zabbix.cache import SingleFlight
+from . import api_session, mock_methods
+
+
+class Clock(object):
+
+    def __init__(I):
+        I.now = 0
+
+    def __call__(I):
+        return I.now
+
+
+def test_by_name1():
+    'Repeated lookups return the cached instance without a request.'
+    with api_session() as api:
+        api.cache = ObjectCache()
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost"}])
+        host = Host.by_name(api, 'MyHost')
+        calls = api._session.post.call_count
+        assert Host.by_name(api, 'MyHost') is host
+        assert api._session.post.call_count == calls
+        assert api.cache.stats()['hits'] == 1
+
+
+def test_ttl1():
+    'Expired entries are fetched again.'
+    with api_session() as api:
+        clock = Clock()
+        api.cache = ObjectCache(ttl=300, ttls={HostGroup: 10}, clock=clock)
+        api.mock_reply(result=[{"groupid":"14","name":"MyGroup"}])
+        group = HostGroup.by_name(api, 'MyGroup')
+        clock.now = 11
+        assert HostGroup.by_name(api, 'MyGroup') is not group
+
+
+def test_lru1():
+    'Least recently used objects are evicted first.'
+    with api_session() as api:
+        cache = api.cache = ObjectCache(maxsize=2)
+        for id in ('1', '2', '3'):
+            cache.put(Host(api, hostid=id, name=id), name=id)
+            cache.get(Host, '1')
+        assert cache.get(Host, '1') is not None
+        assert cache.get(Host, '2') is None
+        assert cache.lookup(Host, name='2') is None
+        assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate1():
+    'Invalidated objects are fetched again.'
+    with api_session() as api:
+        api.cache = ObjectCache()
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost"}])
+        host = Host.by_name(api, 'MyHost')
+        api.cache.invalidate(host)
+        assert Host.by_name(api, 'MyHost') is not host
+
+
+def test_item_hosts1():
+    'An item finds its cached host by hostid.'
+    with api_session() as api:
+        api.cache = ObjectCache()
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost"}])
+        host = Host.by_name(api, 'MyHost')
+        item = Item(api, itemid='1', key_='item1', hostid='45')
+        calls = api._session.post.call_count
+        assert item.hosts() == [host]
+        assert api._session.post.call_count == calls
+
+
+def run_threads(n, target):
+    threads = [threading.Thread(target=target) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_for(condition):
+    for i in range(500):
+        if condition():
+            return
+        time.sleep(0.002)
+    raise AssertionError('timed out')
+
+
+def test_coalesce1():
+    'Concurrent identical reads share one request and its reply.'
+    with api_session() as api:
+        api.flights = SingleFlight()
+        release = threading.Event()
+        def host_get(params):
+            release.wait(5)
+            return [{"hostid": "45"}]
+        requests = mock_methods(api, host_get=host_get)
+        replies = []
+        threads = run_threads(8, lambda: replies.append(
+            api.response('host.get', filter=dict(name='MyHost'), output='extend')))
+        wait_for(lambda: api.flights.stats()['hits'] == 7)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert len(requests) == 1
+        assert len(replies) == 8
+        assert all(reply is replies[0] for reply in replies)
+        assert api.flights.stats() == dict(hits=7, misses=1, inflight=0)
+
+
+def test_coalesce2():
+    'Writes and differing reads are not coalesced; errors are shared.'
+    with api_session() as api:
+        api.flights = SingleFlight()
+        requests = mock_methods(
+            api,
+            host_get = lambda params: [],
+            host_update = lambda params: dict(hostids=["45"]),
+        )
+        api.response('host.get', output='extend')
+        api.response('host.get', output=['name'])
+        api.response('host.update', hostid='45', name='a')
+        api.response('host.update', hostid='45', name='a')
+        assert len(requests) == 4
+        assert api.flights.stats()['misses'] == 2
+
+
+def test_coalesce3():
+    'Callers waiting on a failed call get its exception.'
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+    def fail():
+        release.wait(5)
+        raise ApiException(-32500, 'Application error.', '')
+    def call():
+        try:
+            flights.do('key', fail)
+        except ApiException as e:
+            errors.append(e)
+    threads = run_threads(3, call)
+    wait_for(lambda: flights.stats()['hits'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    with assert_raises(ValueError):
+        flights.do('key', lambda: int('x'))
+    assert flights.stats()['inflight'] == 0
+
+
+def test_responses1():
+    'Reads are answered from the cache until they expire or a write of their type.'
+    with api_session() as api:
+        clock = Clock()
+        api.responses = ResponseCache(ttl=60, ttls={'trigger.get': 0}, clock=clock)
+        requests = mock_methods(
+            api,
+            hostgroup_get = lambda params: [{"groupid": "14"}],
+            usergroup_get = lambda params: [{"usrgrpid": "7"}],
+            trigger_get = lambda params: [],
+            hostgroup_massadd = lambda params: dict(groupids=["14"]),
+        )
+        api.response('hostgroup.get', filter=dict(name='MyGroup'))
+        api.response('usergroup.get', output='extend')
+        assert api.response('hostgroup.get', filter=dict(name='MyGroup')) == dict(
+            jsonrpc='2.0', id=requests[0]['id'], result=[{"groupid": "14"}])
+        api.response('trigger.get')
+        api.response('trigger.get')
+        assert len(requests) == 4
+        api.response('hostgroup.massadd', groups=[dict(groupid='14')], hosts=[dict(hostid='45')])
+        api.response('hostgroup.get', filter=dict(name='MyGroup'))
+        api.response('usergroup.get', output='extend')
+        assert len(requests) == 6
+        clock.now = 61
+        api.response('usergroup.get', output='extend')
+        assert len(requests) == 7
+        assert api.responses.stats() == dict(hits=2, misses=4, evictions=0, invalidations=1, size=2)
+
+
+def test_responses2():
+    'Closed history windows never expire; open ones and the least recent are dropped.'
+    clock = Clock()
+    cache = ResponseCache(maxsize=2, ttl=60, lag=60, clock=clock, now=lambda: 10000)
+    closed = dict(itemids='1', time_from='0', time_till='9000')
+    open_ = dict(itemids='1', time_from='0', time_till='9990')
+    cache.put('closed', 'history.get', closed, 'a')
+    cache.put('open', 'history.get', open_, 'b')
+    clock.now = 1000
+    assert cache.get('closed') == 'a'
+    assert cache.get('open') is None
+    cache.put('host', 'host.get', {}, 'c')
+    cache.put('item', 'item.get', {}, 'd')
+    assert cache.get('closed') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_responses3():
+    'Host membership changes drop cached groups.'
+    with api_session() as api:
+        api.responses = ResponseCache()
+        members = []
+        def host_massadd(params):
+            members.extend(params['hosts'])
+            return dict(hostids=[host['hostid'] for host in params['hosts']])
+        mock_methods(
+            api,
+            hostgroup_get = lambda params: [dict(groupid='14', name='MyGroup', hosts=[
+                dict(hostid=host['hostid'], name='host' + host['hostid']) for host in members])],
+            host_massadd = host_massadd,
+        )
+        group = HostGroup.by_name(api, 'MyGroup')
+        assert group.hosts == {}
+        group.add_hosts([Host(api, hostid='45', name='host45')])
+        assert list(HostGroup.by_name(api, 'MyGroup').hosts) == ['host45']
+
+
+def test_responses4():
+    'Writes drop the cached replies embedding their objects.'
+    with api_session() as api:
+        api.responses = ResponseCache()
+        requests = mock_methods(
+            api,
+            host_get = lambda params: [dict(hostid='45', items=[])],
+            item_update = lambda params: dict(itemids=['1']),
+            trigger_create = lambda params: dict(triggerids=['9']),
+        )
+        api.response('host.get', selectItems='extend')
+        api.response('item.update', itemid='1', status=1)
+        api.response('host.get', selectItems='extend')
+        api.response('trigger.create', description='x', expression='{1}=0')
+        api.response('host.get', selectItems='extend')
+        assert [r['method'] for r in requests] == ['host.get', 'item.update', 'host.get', 'trigger.create', 'host.get']
+
+
+def test_responses5():
+    'A read running while a write of its type completes is not cached.'
+    with api_session() as api:
+        api.responses = ResponseCache()
+        def host_get(params):
+            api.responses.written('host.update')
+            return [dict(hostid='45')]
+        requests = mock_methods(api, host_get=host_get)
+        api.response('host.get')
+        api.response('host.get')
+        assert len(requests) == 2
+        assert len(api.responses) == 0
@@ -0,0 +1,84 @@
+import json
+from unittest import SkipTest
+from mock import Mock
+from nose.tools import assert_raises
+from zabbix import ApiException
+from zabbix import codec
+from zabbix.codec import JsonCodec, OrjsonCodec, iter_result
+from . import api_session
+
+ROWS = [
+    {"itemid": "1", "clock": "1391709315", "value": 'a "quoted" \\ [value], {x}', "ns": "0"},
+    {"itemid": "2", "clock": "1391709316", "value": "2", "ns": "0", "tags": [{"tag": "a"}]},
+    {"itemid": "3", "clock": "1391709317", "value": "", "ns": "0"},
+]
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def check(reply):
+    if 'error' in reply:
+        raise ApiException(reply['error']['code'], reply['error']['message'], reply['error']['data'])
+    return reply
+
+
+def test_iter_result1():
+    'Result elements are decoded whatever the chunk boundaries.'
+    data = json.dumps(dict(jsonrpc='2.0', result=ROWS, id=1)).encode('utf-8')
+    for size in (1, 2, 7, len(data)):
+        assert list(iter_result(split(data, size), json.loads, check)) == ROWS
+
+
+def test_iter_result2():
+    'Empty and non-array results are returned too.'
+    data = b'{"jsonrpc": "2.0", "result": [], "id": 1}'
+    assert list(iter_result(split(data, 3), json.loads, check)) == []
+    data = b'{"jsonrpc": "2.0", "result": "36fc69043640c433c0010773499b44af", "id": 1}'
+    assert list(iter_result(split(data, 3), json.loads, check)) == ['36fc69043640c433c0010773499b44af']
+
+
+def test_iter_result3():
+    'Errors are passed to check.'
+    data = b'{"jsonrpc": "2.0", "error": {"code": -32602, "message": "Invalid params.", "data": "[x]"}, "id": 1}'
+    with assert_raises(ApiException) as cm:
+        list(iter_result(split(data, 5), json.loads, check))
+    assert cm.exception.code == -32602
+
+
+def test_codecs1():
+    'The json codec decodes bytes.'
+    json_codec = JsonCodec()
+    assert json_codec.loads(json_codec.dumps(ROWS).encode('utf-8')) == ROWS
+
+
+def test_codecs2():
+    'The orjson codec decodes bytes.'
+    if codec.orjson is None:
+        raise SkipTest('orjson not installed')
+    orjson_codec = OrjsonCodec()
+    assert orjson_codec.loads(orjson_codec.dumps(ROWS)) == ROWS
+
+
+def test_iter_response1():
+    'Api.iter_response streams result elements.'
+    with api_session() as api:
+        data = json.dumps(dict(jsonrpc='2.0', result=ROWS, id=1)).encode('utf-8')
+        api._session.post.return_value = Mock(iter_content=lambda size: iter(split(data, 10)))
+        with api.measure() as metrics:
+            assert list(api.iter_response('history.get', itemids=['1', '2', '3'])) == ROWS
+        assert api._session.post.call_args[1]['stream']
+        assert metrics.snapshot()['history.get']['response_bytes'] == len(data)
+
+
+def test_iter_response2():
+    'The response is closed when the caller stops early.'
+    with api_session() as api:
+        data = json.dumps(dict(jsonrpc='2.0', result=ROWS, id=1)).encode('utf-8')
+        response = api._session.post.return_value = Mock(iter_content=lambda size: iter(split(data, 10)))
+        rows = api.iter_response('history.get', itemids=['1', '2', '3'])
+        assert next(rows) == ROWS[0]
+        assert not response.close.called
+        rows.close()
+        assert response.close.called
@@ -0,0 +1,51 @@
+from nose.tools import assert_raises
+from zabbix import ApiException, Collection, Host, Item, Trigger
+from . import api_session
+
+
+def make_items(api):
+    return [
+        Item._from_reply(api, dict(itemid=str(i), hostid=str(40 + i % 3), key_=key, status=str(i % 2)))
+        for i, key in enumerate(['system.cpu.load', 'agent.ping', 'system.cpu.load', 'agent.ping', 'vfs.fs'])
+    ]
+
+
+def test_where1():
+    'Equality queries combine indexes and scans, keeping insertion order.'
+    with api_session() as api:
+        items = make_items(api)
+        coll = Collection(Item, items, indexes=('key_', 'status'))
+        assert coll.where(key_='system.cpu.load') == [items[0], items[2]]
+        assert coll.where(key_='agent.ping', status='1') == [items[1], items[3]]
+        assert coll.where(key_=['vfs.fs', 'agent.ping'], hostid='41') == [items[1], items[4]]
+        assert coll.where(status=1, key_='vfs.fs') == []
+        assert coll.values('key_') == set(['system.cpu.load', 'agent.ping', 'vfs.fs'])
+        with assert_raises(ApiException):
+            coll.where(nope=1)
+
+
+def test_where2():
+    'Indexes follow changed values and removed objects.'
+    with api_session() as api:
+        items = make_items(api)
+        coll = Collection(Item, items, indexes=('key_', 'status'))
+        items[0].status = 1
+        items[4].key_ = 'agent.ping'
+        assert coll.where(status=1) == [items[0], items[1], items[3]]
+        assert coll.where(key_='agent.ping') == [items[1], items[3], items[4]]
+        coll.discard(items[1])
+        assert coll.where(status=1) == [items[0], items[3]]
+        assert items[1]._watchers == []
+        assert len(coll) == 4 and items[1] not in coll
+        assert coll.where(key_='vfs.fs') == []
+
+
+def test_between1():
+    'Range queries on an indexed property compare distinct values.'
+    with api_session() as api:
+        triggers = [Trigger._from_reply(api, dict(triggerid=str(i), priority=str(i % 6))) for i in range(12)]
+        coll = Collection(Trigger, triggers, indexes=('priority',))
+        assert [t.id for t in coll.between('priority', 4)] == ['4', '5', '10', '11']
+        assert [t.id for t in coll.between('priority', hi=0)] == ['0', '6']
+        hosts = [Host._from_reply(api, dict(hostid=str(i), available=str(i % 3))) for i in range(6)]
+        assert [h.id for h in Collection(Host, hosts).between('available', 2)] == ['2', '5']
@@ -1,6 +1,9 @@
 
-from zabbix import Host
-from . import api_session
+import json
+from mock import Mock
+from nose.tools import assert_raises
+from zabbix import ApiException, Host, HostGroup, ObjectCache, prefetch
+from . import api_session, mock_methods
 
 
 def test_items1():
@@ -12,3 +15,94 @@ def test_items1():
         assert isinstance(host.items, dict)
         assert len(host.items) == 1
         assert 'Memory' in host.items
+
+
+def test_by_names1():
+    'Many hosts are looked up by name in chunks, missing names map to None.'
+    with api_session() as api:
+        names = ['host{}'.format(i) for i in range(5)]
+        def post(endpoint, data):
+            wanted = json.loads(data)['params']['filter']['name']
+            result = [dict(hostid=name[4:], name=name) for name in wanted if name != 'host3']
+            text = json.dumps(dict(jsonrpc='2.0', id=0, result=result))
+            return Mock(text=text, content=text.encode('utf-8'))
+        api._session.post.side_effect = post
+        calls = api._session.post.call_count
+        hosts = Host.by_names(api, names + ['host1'], chunk=2)
+        assert api._session.post.call_count - calls == 3
+        assert sorted(hosts) == names
+        assert hosts['host3'] is None
+        assert hosts['host4'].id == '4'
+
+
+def test_by_names2():
+    'Cached hosts are not fetched again.'
+    with api_session() as api:
+        api.cache = ObjectCache()
+        api.mock_reply(result=[{"hostid":"45","name":"MyHost"}])
+        host = Host.by_name(api, 'MyHost')
+        calls = api._session.post.call_count
+        assert Host.by_names(api, ['MyHost']) == {'MyHost': host}
+        assert api._session.post.call_count == calls
+
+
+ITEMS = [
+    {"itemid": "1", "hostid": "1", "key_": "cpu"},
+    {"itemid": "2", "hostid": "1", "key_": "mem"},
+    {"itemid": "3", "hostid": "2", "key_": "cpu"},
+]
+
+def get_items(params):
+    return [item for item in ITEMS if item['hostid'] in params['hostids']]
+
+
+def test_prefetch1():
+    'Items and triggers of many hosts are loaded with one request each.'
+    with api_session() as api:
+        hosts = [Host(api, hostid=id, name='host' + id) for id in ('1', '2', '3')]
+        requests = mock_methods(api,
+            item_get = get_items,
+            trigger_get = lambda params: [
+                {"triggerid": "10", "description": "shared", "hosts": [{"hostid": "1"}, {"hostid": "2"}]},
+            ],
+        )
+        prefetch(hosts, 'items', 'triggers')
+        assert len(requests) == 2
+        assert sorted(hosts[0].items) == ['cpu', 'mem']
+        assert list(hosts[1].items) == ['cpu']
+        assert hosts[2].items == {}
+        assert [t.id for t in hosts[1].triggers()] == ['10']
+        assert hosts[2].triggers() == []
+        assert len(requests) == 2
+
+
+def test_siblings1():
+    'Hosts of a group get their items in one request.'
+    with api_session() as api:
+        api.mock_reply(result=[{"groupid": "14", "name": "MyGroup",
+                                "hosts": [{"hostid": "1", "name": "host1"}, {"hostid": "2", "name": "host2"}]}])
+        group = HostGroup.by_name(api, 'MyGroup')
+        requests = mock_methods(api, item_get=get_items)
+        assert list(group.hosts['host2'].items) == ['cpu']
+        assert sorted(group.hosts['host1'].items) == ['cpu', 'mem']
+        assert len(requests) == 1
+        assert sorted(requests[0]['params']['hostids']) == ['1', '2']
+
+
+def test_siblings2():
+    'Items of a group are loaded again after a failed request.'
+    with api_session() as api:
+        api.mock_reply(result=[{"groupid": "14", "name": "MyGroup",
+                                "hosts": [{"hostid": "1", "name": "host1"}, {"hostid": "2", "name": "host2"}]}])
+        group = HostGroup.by_name(api, 'MyGroup')
+        def fail(params):
+            raise ApiException(-32500, 'Application error.', '')
+        mock_methods(api, item_get=fail)
+        with assert_raises(ApiException):
+            group.hosts['host1'].items
+        mock_methods(api, item_get=get_items, trigger_get=fail)
+        assert sorted(group.hosts['host1'].items) == ['cpu', 'mem']
+        assert list(group.hosts['host2'].items) == ['cpu']
+        with assert_raises(ApiException):
+            prefetch(group.hosts.values(), 'triggers')
+        assert group.hosts['host1']._trigger_list is None
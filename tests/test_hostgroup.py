@@ -1,6 +1,7 @@
 
-from zabbix import Host, HostGroup
-from . import api_session
+from nose.tools import assert_raises
+from zabbix import ApiException, Host, HostGroup
+from . import api_session, mock_methods
 
 
 def test_create_group1():
@@ -48,3 +49,49 @@ def test_add_host1():
             "hostids": ["45"],
         })
         assert group.add_host(host)
+
+
+def test_massadd1():
+    'Many hosts are added to many groups in chunks, updating both sides.'
+    with api_session() as api:
+        hosts = [Host(api, hostid=str(i), name='host' + str(i)) for i in range(5)]
+        groups = [HostGroup(api, groupid=str(i), name='group' + str(i)) for i in (10, 11)]
+        requests = mock_methods(api,
+            host_massadd = lambda params: dict(hostids=[h['hostid'] for h in params['hosts'] if h['hostid'] != '3']))
+        added = HostGroup.massadd(api, groups, hosts, chunk=2)
+        assert len(requests) == 3
+        assert added == [h for h in hosts if h.id != '3']
+        assert sorted(groups[0].hosts) == ['host0', 'host1', 'host2', 'host4']
+        assert sorted(hosts[0].groups) == ['group10', 'group11']
+        assert hosts[3].groups == {}
+
+
+def test_remove_hosts1():
+    'Hosts removed from a group are dropped from both sides.'
+    with api_session() as api:
+        hosts = [Host(api, hostid=str(i), name='host' + str(i)) for i in range(3)]
+        group = HostGroup(api, groupid='10', name='group10')
+        mock_methods(api, host_massadd=lambda params: dict(hostids=[h['hostid'] for h in params['hosts']]))
+        group.add_hosts(hosts)
+        requests = mock_methods(api, host_massremove=lambda params: dict(hostids=params['hostids']))
+        assert group.remove_hosts(hosts[:2]) == hosts[:2]
+        assert requests[0]['params'] == dict(groupids=['10'], hostids=['0', '1'])
+        assert list(group.hosts) == ['host2']
+        assert hosts[0].groups == {}
+
+
+def test_massadd2():
+    'Chunks confirmed before a failing one are applied.'
+    with api_session() as api:
+        hosts = [Host(api, hostid=str(i), name='host' + str(i)) for i in range(4)]
+        group = HostGroup(api, groupid='10', name='group10')
+        def host_massadd(params):
+            if params['hosts'][0]['hostid'] == '2':
+                raise ApiException(-32500, 'Application error.', '')
+            return dict(hostids=[h['hostid'] for h in params['hosts']])
+        mock_methods(api, host_massadd=host_massadd)
+        with assert_raises(ApiException):
+            group.add_hosts(hosts, chunk=2)
+        assert sorted(group.hosts) == ['host0', 'host1']
+        assert list(hosts[1].groups) == ['group10']
+        assert hosts[2].groups == {}
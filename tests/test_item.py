@@ -1,6 +1,12 @@
-
-from zabbix import Item
-from . import api_session
+import json
+from unittest import SkipTest
+from mock import Mock
+from nose.tools import assert_raises
+from datetime import datetime, timedelta
+from zabbix import ApiException, Item, prefetch
+from zabbix.objects import item as item_module
+from zabbix.objects.item import Trend
+from . import api_session, mock_methods
 
 
 def test_history_text1():
@@ -37,3 +43,201 @@ def test_history_float1():
         ])
         l = item.get_history()
         assert [-1.1, 2.59] == [i[1] for i in l]
+
+
+def require_numpy():
+    """
+    Skip the calling test when the optional numpy is not installed, and
+    return it otherwise.
+    """
+    if item_module.numpy is None:
+        raise SkipTest('numpy not installed')
+    return item_module.numpy
+
+
+def test_history_columnar1():
+    'Numeric history can be retrieved as numpy arrays.'
+    numpy = require_numpy()
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT)
+        api.mock_reply(result=[
+            {"itemid": "1", "ns": "500", "value": "-1.1", "clock": "1391709316"},
+            {"itemid": "1", "ns": "0", "value": "2.59", "clock": "1391709315"},
+        ])
+        h = item.get_history(columnar=True)
+        assert h.ts.dtype == numpy.int64
+        assert list(h.ts) == [1391709316000000500, 1391709315000000000]
+        assert h.value.dtype == numpy.float64
+        assert list(h.value) == [-1.1, 2.59]
+
+
+def test_history_columnar2():
+    'Unsigned history is returned as uint64.'
+    numpy = require_numpy()
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT)
+        api.mock_reply(result=[
+            {"itemid": "1", "ns": "0", "value": "18446744073709551615", "clock": "1391709315"},
+        ])
+        h = item.get_history(columnar=True)
+        assert h.value.dtype == numpy.uint64
+        assert h.value[0] == 2**64 - 1
+
+
+def mock_history(api, rows):
+    """
+    Mock session.post() to answer history.get from `rows` like the server.
+    """
+    def post(endpoint, data):
+        params = json.loads(data)['params']
+        itemids = params['itemids']
+        if not isinstance(itemids, list):
+            itemids = [itemids]
+        result = [row for row in rows
+                  if row['itemid'] in itemids
+                  and row.get('history', params['history']) == params['history']
+                  and int(row['clock']) >= int(params.get('time_from', 0))
+                  and int(row['clock']) <= int(params.get('time_till', 2**32))]
+        result.sort(key=lambda row: int(row['clock']))
+        if params.get('limit'):
+            result = result[:params['limit']]
+        text = json.dumps(dict(jsonrpc='2.0', id=0, result=result))
+        return Mock(text=text, content=text.encode('utf-8'))
+    api._session.post.side_effect = post
+
+
+def test_iter_history1():
+    'History is paged by clock without losing or repeating rows.'
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT)
+        rows = [{"itemid": "1", "ns": str(ns), "value": str(clock * 10 + ns), "clock": str(clock)}
+                for clock in range(100, 110) for ns in range(3)]
+        mock_history(api, rows)
+        values = [val for ts, val in item.iter_history(chunk=4)]
+        assert values == [int(row['value']) for row in rows]
+
+
+def test_iter_history2():
+    'A page within a single second is read whole, up to per_second rows.'
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT)
+        rows = [{"itemid": "1", "ns": str(ns), "value": str(ns), "clock": "100"} for ns in range(5)]
+        rows.append({"itemid": "1", "ns": "0", "value": "5", "clock": "101"})
+        mock_history(api, rows)
+        values = [val for ts, val in item.iter_history(chunk=2)]
+        assert values == list(range(6))
+        with assert_raises(ApiException):
+            list(item.iter_history(chunk=2, per_second=4))
+
+
+def test_iter_history3():
+    'History can be paged as columnar blocks.'
+    require_numpy()
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT)
+        rows = [{"itemid": "1", "ns": "0", "value": str(clock), "clock": str(clock)} for clock in range(10)]
+        mock_history(api, rows)
+        blocks = list(item.iter_history(chunk=4, columnar=True))
+        assert [len(block.value) for block in blocks] == [3, 3, 3, 1]
+        assert sum(block.value.sum() for block in blocks) == sum(range(10))
+
+
+def test_iter_history4():
+    'Replies are not reordered in place, as they may be shared.'
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT)
+        shared = [{"itemid": "1", "ns": "0", "value": str(clock), "clock": str(clock)} for clock in (3, 1, 2)]
+        api.response = lambda method, **params: dict(result=shared)
+        assert [val for ts, val in item.iter_history()] == [1, 2, 3]
+        assert [row['clock'] for row in shared] == ['3', '1', '2']
+
+
+def test_get_histories1():
+    'History of many items is fetched per value_type and split per item.'
+    with api_session() as api:
+        items = [Item(api, itemid=str(i), key_='item' + str(i), value_type=i % 2 and Item.TYPE_INT or Item.TYPE_FLOAT)
+                 for i in range(1, 6)]
+        rows = [{"itemid": item.id, "history": item.value_type.val, "ns": "0",
+                 "value": item.id, "clock": str(clock)}
+                for item in items for clock in (100, 101)]
+        mock_history(api, rows)
+        calls = api._session.post.call_count
+        histories = Item.get_histories(api, items, chunk=2)
+        assert api._session.post.call_count - calls == 3
+        for item in items:
+            assert [val for ts, val in histories[item]] == [item._typed_value(item.id)] * 2
+
+
+def test_get_histories2():
+    'Objects of the same item each get its history.'
+    with api_session() as api:
+        a, b = [Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT) for i in range(2)]
+        mock_history(api, [{"itemid": "1", "ns": "0", "value": "7", "clock": "100"}])
+        histories = Item.get_histories(api, [a, b])
+        assert api._session.post.call_count == 2 # login + history
+        assert histories[a] == histories[b] == [('100', 7)]
+
+
+def test_trends1():
+    'Trends are returned typed, oldest first.'
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT)
+        api.mock_reply(result=[
+            {"itemid": "1", "clock": "1391713200", "num": "60", "value_min": "0.5", "value_avg": "1.5", "value_max": "2.5"},
+            {"itemid": "1", "clock": "1391709600", "num": "59", "value_min": "0.1", "value_avg": "1.1", "value_max": "2.1"},
+        ])
+        trends = item.get_trends()
+        assert [t.clock for t in trends] == [1391709600, 1391713200]
+        assert trends[0] == Trend(1391709600, 59, 0.1, 1.1, 2.1)
+
+
+def test_uses_trends1():
+    'Trends are used beyond history retention or for too many raw values.'
+    with api_session() as api:
+        now = datetime.now()
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT, history=7, delay=60)
+        assert not item.uses_trends(now - timedelta(hours=1))
+        assert item.uses_trends(now - timedelta(days=8))
+        assert item.uses_trends(now - timedelta(days=2), points=1000)
+        assert not item.uses_trends(now - timedelta(days=2), points=5000)
+        text = Item(api, itemid='2', key_='item2', value_type=Item.TYPE_TEXT, history=7)
+        assert not text.uses_trends(now - timedelta(days=8))
+
+
+def test_uses_trends2():
+    'History is used where trends are not kept either.'
+    with api_session() as api:
+        now = datetime.now()
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT, history=7, trends=30, delay=60)
+        assert item.uses_trends(now - timedelta(days=40))
+        assert not item.uses_trends(now - timedelta(days=60), now - timedelta(days=40))
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT, history=90, trends=30, delay=60)
+        assert not item.uses_trends(now - timedelta(days=60))
+        assert item.uses_trends(now - timedelta(days=20))
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT, history=7, trends=0)
+        assert not item.uses_trends(now - timedelta(days=8))
+
+
+def test_get_series1():
+    'Trends are read from the oldest kept.'
+    with api_session() as api:
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_FLOAT, history=7, trends=30)
+        requests = mock_methods(api, trend_get=lambda params: [])
+        assert item.get_series(datetime.now() - timedelta(days=40)) == []
+        kept = datetime.now() - timedelta(days=30)
+        assert abs(int(requests[0]['params']['time_from']) - int(kept.strftime('%s'))) < 5
+
+
+def test_prefetch_hosts1():
+    'Hosts of many items are loaded together.'
+    with api_session() as api:
+        items = [Item(api, itemid='1', key_='a', hostid='1'), Item(api, itemid='2', key_='b')]
+        requests = mock_methods(api,
+            item_get = lambda params: [{"itemid": "2", "hostid": "2"}],
+            host_get = lambda params: [{"hostid": id, "name": "host" + id} for id in params['hostids']],
+        )
+        prefetch(items, 'hosts')
+        assert len(requests) == 2
+        assert [h.name.val for h in items[0].hosts()] == ['host1']
+        assert [h.name.val for h in items[1].hosts()] == ['host2']
+        assert len(requests) == 2
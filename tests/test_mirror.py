@@ -0,0 +1,119 @@
+from zabbix import Host, HostGroup, Item
+from zabbix.mirror import Mirror
+from . import api_session, mock_methods
+
+
+class Inventory(object):
+    """
+    Server data answering `<type>.get` like the API: tracked properties
+    (`output` list) of all objects, or all properties of given ids.
+    """
+
+    def __init__(I):
+        I.hostgroup = {
+            '14': dict(groupid='14', name='X', flags='0', internal='0'),
+        }
+        I.host = {
+            '45': dict(hostid='45', host='web1', name='web1', status='0', available='1',
+                       groups=[dict(groupid='14')]),
+            '46': dict(hostid='46', host='web2', name='web2', status='0', available='1',
+                       groups=[dict(groupid='14')]),
+        }
+        I.item = {
+            '1': dict(itemid='1', hostid='45', key_='Y', name='Y', status='1', state='0',
+                      value_type='3', units='', delay='60', lastvalue='5'),
+            '2': dict(itemid='2', hostid='46', key_='Y', name='Y', status='0', state='0',
+                      value_type='3', units='', delay='60', lastvalue='7'),
+        }
+        I.trigger = {
+            '9': dict(triggerid='9', description='down', expression='{1}=0', priority='4', status='0',
+                      state='0', value='1', lastchange='1400000000', hosts=[dict(hostid='45')]),
+        }
+
+    def handler(I, kind, id):
+        def get(params):
+            rows = getattr(I, kind)
+            if params['output'] == 'extend':
+                return [dict((k, v) for k, v in rows[i].items() if k not in ('groups', 'hosts'))
+                        for i in params[id + 's'] if i in rows]
+            fields = params['output'] + list(k[6:].lower() for k in params if k.startswith('select'))
+            return [dict((k, v) for k, v in row.items() if k in fields) for row in rows.values()]
+        return get
+
+    def mock(I, api):
+        return mock_methods(
+            api,
+            hostgroup_get = I.handler('hostgroup', 'groupid'),
+            host_get = I.handler('host', 'hostid'),
+            item_get = I.handler('item', 'itemid'),
+            trigger_get = I.handler('trigger', 'triggerid'),
+        )
+
+
+def test_mirror1():
+    'Loaded objects are linked and queried without requests.'
+    with api_session() as api:
+        requests = Inventory().mock(api)
+        mirror = Mirror(api)
+        group = mirror.by_name(HostGroup, 'X')
+        calls = len(requests)
+        hosts = [host for host in group.hosts.values()
+                 if 'Y' in host.items and host.items['Y'].status.val == 1]
+        assert [host.name.val for host in hosts] == ['web1']
+        assert hosts[0].groups == {'X': group}
+        assert [t.description.val for t in hosts[0].triggers()] == ['down']
+        assert mirror.get(Item, 2).hosts() == [mirror.get(Host, 46)]
+        assert [item.id for item in mirror.find(Item, key_='Y', status=0)] == ['2']
+        assert len(requests) == calls
+        assert mirror.stats()['size'] == dict(hostgroup=1, host=2, item=2, trigger=1)
+        assert mirror.last['counts']['item'] == (2, 0, 0)
+        assert mirror.last['calls'] == 8
+
+
+def test_mirror2():
+    'A sync only fetches objects that are new or changed, and drops deleted ones.'
+    with api_session() as api:
+        inventory = Inventory()
+        requests = inventory.mock(api)
+        now = [0]
+        mirror = Mirror(api, max_age=60, clock=lambda: now[0])
+        mirror.sync()
+        item = mirror.get(Item, 1)
+        inventory.item['1'] = dict(inventory.item['1'], status='0', lastvalue='6')
+        inventory.item['3'] = dict(inventory.item['2'], itemid='3', key_='Z')
+        del inventory.host['46']
+        del inventory.item['2']
+        now[0] = 30
+        calls = len(requests)
+        assert mirror.get(Item, 1) is item
+        assert len(requests) == calls
+        now[0] = 61
+        assert mirror.get(Item, 1) is item
+        assert item.status.val == 0 and item.lastvalue.val == '6'
+        assert mirror.find(Item, status=0) == [item, mirror.get(Item, 3)]
+        assert mirror.find(Item, status=1) == []
+        assert mirror.last['counts'] == dict(
+            hostgroup=(0, 0, 0), host=(0, 0, 1), item=(1, 1, 1), trigger=(0, 0, 0))
+        assert mirror.last['calls'] == 5
+        fetched = [r['params']['itemids'] for r in requests[calls:] if r['params']['output'] == 'extend']
+        assert sorted(fetched[0]) == ['1', '3']
+        assert mirror.get(Host, 46) is None
+        assert list(mirror.by_name(HostGroup, 'X').hosts) == ['web1']
+        assert mirror.get(Item, 3).hosts() == []
+        assert mirror.age == 0
+
+
+def test_mirror3():
+    'Indexed properties are tracked, so a change of availability alone is synced.'
+    with api_session() as api:
+        inventory = Inventory()
+        inventory.mock(api)
+        mirror = Mirror(api)
+        mirror.sync()
+        assert mirror.find(Host, available=2) == []
+        inventory.host['46'] = dict(inventory.host['46'], available='2')
+        mirror.sync()
+        assert mirror.find(Host, available=2) == [mirror.get(Host, 46)]
+        assert mirror.last['counts']['host'] == (0, 1, 0)
+        for C, names in Mirror.INDEXES.items():
+            assert set(names) <= set(Mirror.TRACK[C])
@@ -0,0 +1,58 @@
+from nose.tools import assert_raises
+from zabbix import ApiException, Host, Item
+from . import api_session, mock_methods
+
+
+def test_fields1():
+    'Only the requested fields are fetched and set.'
+    with api_session() as api:
+        requests = mock_methods(api, item_get=lambda params: [{"itemid": "1", "key_": "cpu", "lastvalue": "0.5"}])
+        items = Item.query(api).fields('key_', 'lastvalue').where(hostids='45').all()
+        assert requests[0]['params']['output'] == ['itemid', 'key_', 'lastvalue']
+        assert requests[0]['params']['hostids'] == '45'
+        assert items[0].key_.val == 'cpu'
+        assert not hasattr(items[0], 'description')
+
+
+def test_count1():
+    'Counts are done by the server.'
+    with api_session() as api:
+        requests = mock_methods(api, host_get=lambda params: "42")
+        assert Host.query(api).search(name='web').filter(status=[0, 1]).count() == 42
+        params = requests[0]['params']
+        assert params['countOutput']
+        assert 'output' not in params
+        assert params['search'] == dict(name='web')
+        assert params['filter'] == dict(status=[0, 1])
+
+
+def test_chain1():
+    'Queries are immutable and can be reused.'
+    with api_session() as api:
+        base = Host.query(api).filter(status=0)
+        top = base.sort('name', desc=True).limit(10)
+        assert 'limit' not in base.params
+        assert top.params['sortfield'] == ['name']
+        assert top.params['sortorder'] == 'DESC'
+        assert top.params['filter'] == dict(status=0)
+
+
+def test_unknown1():
+    'Unknown properties raise ApiException.'
+    with api_session() as api:
+        with assert_raises(ApiException):
+            Host.query(api).fields('nope')
+
+
+def test_repr1():
+    'Objects projected without their name repr by id.'
+    with api_session() as api:
+        mock_methods(
+            api,
+            host_get = lambda params: [{"hostid": "45", "status": "0"}],
+            item_get = lambda params: [{"itemid": "1", "lastvalue": "0.5"}],
+        )
+        hosts = Host.query(api).fields('status').all()
+        assert repr(hosts[0]) == 'Host[45]'
+        assert repr(hosts) == '[Host[45]]'
+        assert repr(Item.query(api).fields('lastvalue').all()[0]) == 'Item[1]'
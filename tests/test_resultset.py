@@ -0,0 +1,107 @@
+from nose.tools import assert_raises
+from unittest import SkipTest
+from mock import patch
+from zabbix import ApiException, Host, Item, ResultMap, ResultSet
+from zabbix.objects import resultset
+from . import api_session, mock_methods
+
+
+def make_hosts(api, n=6):
+    return ResultSet([
+        Host._from_reply(api, dict(hostid=str(i), name='host{}'.format(i), available=str(i % 3), status=str(i % 2)))
+        for i in range(n)
+    ])
+
+
+def test_query1():
+    'Query results are ResultSets of their class.'
+    with api_session() as api:
+        api.mock_reply(result=[{"hostid": "45", "name": "web1"}])
+        hosts = Host.query(api).all()
+        assert isinstance(hosts, ResultSet) and hosts.C is Host
+        assert hosts.column('name') == ['web1']
+        assert hosts.column('status') == [None]
+
+
+def test_columns1():
+    'Filter, order and group by columns.'
+    with api_session() as api:
+        hosts = make_hosts(api)
+        assert hosts.column('available') == [0, 1, 2, 0, 1, 2]
+        assert hosts.filter(available=2).column('name') == ['host2', 'host5']
+        assert hosts.filter(available=[0, '1'], status=1).column('name') == ['host1', 'host3']
+        assert hosts.order_by('available', 'name', desc=True).column('name')[:3] == ['host5', 'host2', 'host4']
+        groups = hosts.group_by('status')
+        assert sorted(groups) == [0, 1]
+        assert groups[1].column('name') == ['host1', 'host3', 'host5']
+        assert isinstance(hosts[1:3], ResultSet) and hosts[1:3].C is Host
+        with assert_raises(ApiException):
+            hosts.column('nope')
+        with assert_raises(ApiException):
+            hosts.filter([True])
+        assert ResultSet([], Host).filter(status=1) == []
+
+
+def test_bulk1():
+    'Bulk lookups return ResultSets, or a ResultMap of them by name.'
+    with api_session() as api:
+        mock_methods(api,
+            host_get = lambda params: [dict(hostid='4' + name[-1], name=name, status='0')
+                                       for name in params.get('filter', {}).get('name', ['web1'])
+                                       if name.startswith('web')],
+        )
+        hosts = Host.by_names(api, ['web1', 'nope', 'web2'])
+        assert isinstance(hosts, ResultMap) and hosts['nope'] is None
+        found = hosts.found()
+        assert isinstance(found, ResultSet) and found.C is Host
+        assert found.filter(status=0).column('name') == ['web1', 'web2']
+        item = Item(api, itemid='1', key_='a')
+        assert isinstance(item.hosts(), ResultSet) and item.hosts().C is Host
+        assert found.order_by() == found
+
+
+def test_order1():
+    'Objects without a value sort first, ascending or descending.'
+    with api_session() as api:
+        hosts = make_hosts(api, 3)
+        hosts.append(Host._from_reply(api, dict(hostid='9', name='nameless')))
+        assert hosts.order_by('available').column('hostid') == ['9', '0', '1', '2']
+        assert hosts.order_by('available', desc=True).column('hostid') == ['9', '2', '1', '0']
+
+
+def test_columns2():
+    'Columns can be numpy arrays, and numpy comparisons filter.'
+    if resultset.numpy is None:
+        raise SkipTest('numpy not installed')
+    with api_session() as api:
+        hosts = make_hosts(api)
+        assert hosts.filter(hosts.array('available') > 1).column('name') == ['host2', 'host5']
+    with patch('zabbix.objects.resultset.numpy', None):
+        with assert_raises(ImportError):
+            hosts.array('available')
+
+
+def test_dataframe1():
+    'Columns are handed to pandas, indexed by id.'
+    with api_session() as api:
+        hosts = make_hosts(api, 2)
+        with patch('zabbix.objects.resultset.pandas') as pandas:
+            hosts.to_dataframe(['name', 'available'])
+        pandas.DataFrame.assert_called_once_with(
+            dict(name=['host0', 'host1'], available=[0, 1]), index=['0', '1'], columns=['name', 'available'])
+        with patch('zabbix.objects.resultset.pandas', None):
+            with assert_raises(ImportError):
+                hosts.to_dataframe()
+
+
+def test_html1():
+    'Only one page of rows is rendered, with loaded properties only and truncated values.'
+    with api_session() as api:
+        hosts = make_hosts(api, 120)
+        hosts[0].name = 'x' * 100 + '<b>'
+        html = hosts._repr_html_()
+        assert '120 Hosts, rows 1-50' in html
+        assert html.count('<tr>') == 51 # header + rows
+        assert '<th>available</th>' in html and '<th>host</th>' not in html
+        assert 'x' * 39 + '…' in html and '<b>' not in html
+        assert '120 Hosts, rows 101-120' in hosts.html(page=2)
@@ -0,0 +1,75 @@
+from datetime import datetime
+from zabbix import Item
+from zabbix.store import HistoryStore
+from . import api_session
+from .test_item import mock_history
+
+
+def rows_until(clock):
+    return [{"itemid": "1", "ns": "0", "value": str(c), "clock": str(c)} for c in range(1000, clock)]
+
+
+def test_store1():
+    'Held ranges are served locally, only the missing tail is fetched.'
+    with api_session() as api:
+        now = [1100]
+        store = HistoryStore(':memory:', lag=10, clock=lambda: now[0])
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT)
+        mock_history(api, rows_until(1100))
+        ts_from = datetime.fromtimestamp(1000)
+        assert [val for ts, val in store.get_history(item, ts_from)] == list(range(1000, 1100))
+        assert store.ranges(item) == [(1000, 1090)]
+        calls = api._session.post.call_count
+        assert len(store.get_history(item, ts_from, datetime.fromtimestamp(1050))) == 51
+        assert api._session.post.call_count == calls
+        now[0] = 1200
+        mock_history(api, rows_until(1200))
+        assert [val for ts, val in store.get_history(item, ts_from)] == list(range(1000, 1200))
+        assert store.ranges(item) == [(1000, 1190)]
+
+
+def test_store2():
+    'Gaps between held ranges are filled.'
+    with api_session() as api:
+        store = HistoryStore(':memory:', lag=0, clock=lambda: 2000)
+        item = Item(api, itemid='1', key_='item1', value_type=Item.TYPE_INT)
+        mock_history(api, rows_until(1100))
+        store.get_history(item, datetime.fromtimestamp(1000), datetime.fromtimestamp(1010))
+        store.get_history(item, datetime.fromtimestamp(1050), datetime.fromtimestamp(1060))
+        assert store.missing(item, 1000, 1060) == [(1011, 1049)]
+        values = [val for ts, val in store.get_history(item, datetime.fromtimestamp(1000), datetime.fromtimestamp(1060))]
+        assert values == list(range(1000, 1061))
+        assert store.ranges(item) == [(1000, 1060)]
+
+
+def test_store3():
+    'The oldest ranges are evicted above max_bytes.'
+    with api_session() as api:
+        store = HistoryStore(':memory:', lag=0, clock=lambda: 2000)
+        items = [Item(api, itemid=id, key_='item' + id, value_type=Item.TYPE_INT) for id in ('1', '2')]
+        rows = [{"itemid": id, "ns": "0", "value": str(c), "clock": str(c)}
+                for id in ('1', '2') for c in range(1000, 1900)]
+        mock_history(api, rows)
+        store.get_history(items[0], datetime.fromtimestamp(1000))
+        store.max_bytes = store.size()
+        store.get_history(items[1], datetime.fromtimestamp(1500))
+        assert store.ranges(items[0]) == []
+        assert store.ranges(items[1]) == [(1500, 2000)]
+
+
+def test_store4():
+    'Eviction stops once enough rows are deleted, even if no page is freed.'
+    with api_session() as api:
+        store = HistoryStore(':memory:', lag=0, clock=lambda: 3000)
+        items = [Item(api, itemid=id, key_='item' + id, value_type=Item.TYPE_INT) for id in ('1', '2')]
+        rows = [{"itemid": id, "ns": "0", "value": str(c), "clock": str(c)}
+                for id in ('1', '2') for c in range(1000, 3000)]
+        mock_history(api, rows)
+        # Interleave the rows of both items in the file.
+        for c in range(1000, 3000, 20):
+            store.get_history(items[0], datetime.fromtimestamp(c), datetime.fromtimestamp(c + 19))
+            store.get_history(items[1], datetime.fromtimestamp(c + 1), datetime.fromtimestamp(c + 20))
+        store.max_bytes = store.size() * 3 // 4
+        store.get_history(items[1], datetime.fromtimestamp(1001), datetime.fromtimestamp(1020))
+        assert store.ranges(items[0]) == []
+        assert store.ranges(items[1]) == [(1001, 3000)]
@@ -0,0 +1,45 @@
+from zabbix.objects.trigger import ProblemTracker
+from . import api_session, mock_methods
+
+
+def trigger(id, value, lastchange, priority='3'):
+    return dict(triggerid=id, description='trigger' + id, value=str(value),
+                lastchange=str(lastchange), priority=priority)
+
+
+def test_tracker1():
+    'Only changes since the last poll are fetched and reported.'
+    with api_session() as api:
+        triggers = {'1': trigger('1', 1, 100), '2': trigger('2', 0, 50), '3': trigger('3', 1, 120)}
+        def get(params):
+            rows = sorted(triggers.values(), key=lambda t: -int(t['lastchange']))
+            if 'limit' in params:
+                return rows[:params['limit']]
+            if 'filter' in params:
+                return [t for t in rows if t['value'] == '1']
+            return [t for t in rows if int(t['lastchange']) > params['lastChangeSince']]
+        requests = mock_methods(api, trigger_get=get)
+        tracker = ProblemTracker(api)
+
+        changes = tracker.poll()
+        assert sorted(t.id for t in changes.added) == ['1', '3']
+        assert sorted(tracker.problems) == ['1', '3']
+
+        changes = tracker.poll()
+        assert requests[-1]['params']['lastChangeSince'] == 119
+        assert changes == ([], [], [])
+
+        triggers['1'] = trigger('1', 0, 130)
+        triggers['2'] = trigger('2', 1, 140)
+        triggers['3'] = trigger('3', 1, 120, priority='5')
+        changes = tracker.poll()
+        assert [t.id for t in changes.added] == ['2']
+        assert [t.id for t in changes.resolved] == ['1']
+        assert sorted(tracker.problems) == ['2', '3']
+        assert [t.id for t in changes.changed] == ['3']
+
+        # Changes in the same second as the last one seen are not missed.
+        triggers['4'] = trigger('4', 1, 140)
+        changes = tracker.poll()
+        assert [t.id for t in changes.added] == ['4']
+        assert changes.changed == []
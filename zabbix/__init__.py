@@ -2,8 +2,13 @@
 A pythonic interface to the Zabbix API.
 """
 
-from .api import Api, ApiException
+from .api import Api, ApiException, Batch, BatchCall
+from .instrument import CallStats, Metrics
+from .cache import ObjectCache, ResponseCache
 
+from .objects import prefetch, save_all
+from .objects.collection import Collection
+from .objects.resultset import ResultMap, ResultSet
 from .objects.host import Host
 from .objects.hostgroup import HostGroup
 from .objects.item import Item
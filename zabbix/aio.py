@@ -0,0 +1,176 @@
+"""
+An asyncio interface to the Zabbix API.
+
+`AsyncApi` mirrors `Api` with awaitable `login` and `response`.  The
+functions below are awaitable versions of the object lookups::
+
+    async with AsyncApi('http://zabbix', limit=50) as api:
+        await api.login('user', 'pass')
+        host = await by_name(Host, api, 'MyHost')
+        for item in (await items(host)).values():
+            ...
+        histories = await asyncio.gather(*[get_history(i) for i in host.items.values()])
+
+Requires [aiohttp](http://aiohttp.readthedocs.org) unless a compatible
+session is given.
+"""
+
+import asyncio
+from timeit import default_timer as timer
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .api import BaseApi, ApiException
+from .instrument import CallStats
+
+__all__ = [
+    'AsyncApi',
+    'by_name',
+    'items',
+    'triggers',
+    'hosts',
+    'get_history',
+]
+
+
+class AsyncApi(BaseApi):
+    """
+    Asyncio counterpart of `Api`.  At most `limit` requests are in flight
+    at once, over a pool of at most `pool` connections (defaults to
+    `limit`).
+    """
+
+    def __init__(I, server, session=None, limit=10, pool=None, cache=None, codec=None):
+        BaseApi.__init__(I, server, cache, codec)
+        I.limit = limit
+        I.pool = pool or limit
+        I._session = session
+        I._semaphore = None
+        I._loop = None
+
+
+    async def login(I, user, password):
+        """
+        Return true if able to authenticate, false otherwise.  Session
+        key is saved in this object for future requests.
+        """
+        try:
+            I._auth = (await I.response('user.login', user=user, password=password)).get('result')
+        except ApiException as e:
+            if e.code != ApiException.FAILED_AUTH:
+                raise
+        return bool(I._auth)
+
+
+    async def response(I, method, *args, **params):
+        """
+        Get "raw" response from zabbix server.
+
+        [Zabbix API Docs](https://www.zabbix.com/documentation/2.2/manual/api/reference)
+        """
+        stats = CallStats(method)
+        start = timer()
+        try:
+            return I._check(await I._post(I._payload(method, params, args), stats))
+        except Exception as e:
+            stats.error = e
+            raise
+        finally:
+            stats.latency = timer() - start
+            I._emit(stats)
+
+
+    async def close(I):
+        """
+        Close the underlying session and its connections.
+        """
+        if I._session is not None:
+            await I._session.close()
+            I._session = None
+
+
+    async def __aenter__(I):
+        return I
+
+    async def __aexit__(I, kind, value, tb):
+        await I.close()
+
+
+    def _get_session(I):
+        if I._session is None:
+            if aiohttp is None:
+                raise ImportError('AsyncApi requires aiohttp')
+            I._session = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(limit=I.pool),
+                headers = {'Content-Type': 'application/json-rpc'},
+            )
+        return I._session
+
+    def _get_semaphore(I):
+        # Before Python 3.10 a semaphore is bound to the loop current when
+        # it is created, so make one in each loop the api is used from.
+        loop = asyncio.get_event_loop()
+        if I._loop is not loop:
+            I._semaphore = asyncio.Semaphore(I.limit)
+            I._loop = loop
+        return I._semaphore
+
+    async def _post(I, payload, stats):
+        data = I.codec.dumps(payload)
+        async with I._get_semaphore():
+            async with I._get_session().post(I._endpoint, data=data) as response:
+                body = await response.read()
+        stats.request_bytes = len(data)
+        stats.response_bytes = len(body)
+        start = timer()
+        try:
+            return I._decode(body)
+        finally:
+            stats.decode_time = timer() - start
+
+
+async def by_name(C, api, name):
+    """
+    Awaitable `Host.by_name` / `HostGroup.by_name`.
+    """
+    obj = C._cached(api, name=name)
+    if obj is None:
+        obj = C._first(api, await api.response(C.API_NAME + '.get', **C._by_name_params(name)), 'name')
+    return obj
+
+
+async def items(host):
+    """
+    Awaitable `Host.items`.  The result is kept on `host` as for `Host.items`.
+    """
+    if host._items is None:
+        host._set_items(await host._api.response('item.get', **host._items_params()))
+    return host._items
+
+
+async def triggers(host):
+    """
+    Awaitable `Host.triggers`.
+    """
+    return host._triggers(await host._api.response('trigger.get', **host._triggers_params()))
+
+
+async def hosts(item):
+    """
+    Awaitable `Item.hosts`.
+    """
+    cached = item._cached_hosts()
+    if cached is not None:
+        return cached
+    return item._hosts(await item._api.response('host.get', **item._hosts_params()))
+
+
+async def get_history(item, ts_from=None, ts_to=None, limit=10, columnar=False):
+    """
+    Awaitable `Item.get_history`.
+    """
+    params = item._history_params(ts_from, ts_to, limit)
+    return item._history(await item._api.response('history.get', **params), columnar)
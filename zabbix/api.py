@@ -6,10 +6,23 @@ import os
 import sys
 import requests
 import json
+import hashlib
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from timeit import default_timer as timer
+from .instrument import CallStats, Metrics
+from .codec import default_codec, iter_result
+from .cache import SingleFlight
 
 __all__ = [
     'Api',
     'ApiException',
+    'BaseApi',
+    'Batch',
+    'BatchCall',
 ]
 
 
@@ -21,6 +34,12 @@ class ApiException(Exception):
     INVALID_VALUE    = -2
     FAILED_AUTH      = -32602
 
+    # `data` of FAILED_AUTH errors about a session key no longer valid.
+    EXPIRED = (
+        'Session terminated, re-login, please.',
+        'Not authorised.',
+    )
+
     def __init__(I, code, msg, data):
         I.code = code
         I.msg = msg
@@ -29,58 +48,497 @@ class ApiException(Exception):
     def __str__(I):
         return "{}: {}: {}".format(I.code, I.msg, I.data)
 
+    @property
+    def expired(I):
+        """
+        True if raised because the session key is no longer valid.
+        """
+        return I.code == I.FAILED_AUTH and I.data in I.EXPIRED
 
-class Api(object):
 
-    def __init__(I, server, session=None):
-        if session is None:
-            session = requests.session()
-            session.headers['Content-Type'] = 'application/json-rpc'
-        I._session = session
+class BaseApi(object):
+    """
+    JSON-RPC bookkeeping shared by the blocking and asyncio clients.
+    """
+
+    def __init__(I, server, cache=None, codec=None):
         I._endpoint = server + '/api_jsonrpc.php'
-        I._id = 0
+        I._ids = itertools.count()  # next() is atomic, so ids stay unique across threads
         I._auth = None
+        I._hooks = ()  # replaced, never changed, so _emit needs no lock
+        I._hooks_lock = threading.Lock()
+        I.cache = cache
+        I.codec = codec or default_codec()
+        # Set to validate server data like user assignments (for debugging).
+        I.validate_replies = False
 
 
-    def login(I, user, password):
+    def instrument(I, hook):
         """
-        Return true if able to authenticate, false otherwise.  Session
-        key is saved in this object for future requests.
+        Register `hook` to be called with the `CallStats` of every
+        request.  Return `hook`.
         """
-        try:
-            I._auth = I.response('user.login', user=user, password=password).get('result')
-        except ApiException as e:
-            if e.code != ApiException.FAILED_AUTH:
-                raise
-        return bool(I._auth)
+        with I._hooks_lock:
+            I._hooks = I._hooks + (hook,)
+        return hook
 
-           
-    def response(I, method, **params):
+    def uninstrument(I, hook):
+        """
+        Unregister a `hook` added by `instrument`.
         """
-        Get "raw" response from zabbix server.
+        with I._hooks_lock:
+            hooks = list(I._hooks)
+            hooks.remove(hook)
+            I._hooks = tuple(hooks)
 
-        [Zabbix API Docs](https://www.zabbix.com/documentation/2.2/manual/api/reference)
+    @contextmanager
+    def measure(I):
+        """
+        Yield a `Metrics` recording only the requests made within the
+        `with` block by the calling thread.  Calls of other threads
+        sharing the api, including the workers of `map`, are not counted.
+        """
+        metrics = Metrics()
+        thread = threading.current_thread()
+        def hook(stats):
+            if threading.current_thread() is thread:
+                metrics(stats)
+        I.instrument(hook)
+        try:
+            yield metrics
+        finally:
+            I.uninstrument(hook)
+
+    def _emit(I, stats):
+        for hook in I._hooks:
+            hook(stats)
+
+
+    def _payload(I, method, params, args=()):
+        """
+        Return JSON-RPC request for `method` with a unique id.  `args`
+        holds at most one positional parameter, used instead of `params`
+        for methods taking an array.
         """
+        if args:
+            (params,) = args
         payload = dict(
             jsonrpc = '2.0',
             method = method,
             params = params,
-            id = I._id,
+            id = next(I._ids),
             auth = I._auth,
         )
-        response = I._session.post(I._endpoint, data=json.dumps(payload))
-        I._id += 1
+        return payload
 
-        if not response.text:
+
+    def _decode(I, body):
+        """
+        Return decoded reply `body` (bytes).
+        """
+        if not body:
             raise ApiException(ApiException.INVALID_REPLY, 'empty reply', '')
         try:
-            reply = json.loads(response.text)
-            print("RESPONSE FROM {}: {}\n".format(method, json.dumps(reply, indent=2)))
+            return I.codec.loads(body)
         except ValueError:
-            raise ApiException(ApiException.INVALID_REPLY, 'invalid json', response.text)
+            raise ApiException(ApiException.INVALID_REPLY, 'invalid json', body)
+
 
+    def _check(I, reply):
+        """
+        Return `reply` or raise `ApiException` if it carries an error.
+        """
+        if not isinstance(reply, dict):
+            raise ApiException(ApiException.INVALID_REPLY, 'unexpected reply', reply)
         if 'error' in reply:
             err = reply['error']
-            raise ApiException(err['code'], err['message'], err['data'])
+            raise ApiException(err['code'], err['message'], err.get('data'))
 
         return reply
+
+
+class Api(BaseApi):
+    """
+    Blocking client of the Zabbix API at `server`.  Pass an
+    `ObjectCache` as `cache` to reuse objects across lookups, a token
+    store (see `zabbix.auth`) as `tokens` to share session keys between
+    processes, and a `codec` (see `zabbix.codec`) to choose the JSON
+    library.
+
+    An `Api` may be shared between threads.  Its session keeps up to
+    `pool` connections open, which is also the default number of threads
+    used by `map`.  With `coalesce`, identical `*.get` calls made by
+    several threads at once share a single request and its reply (which
+    must then not be modified); see `flights.stats()`.  Pass a
+    `ResponseCache` as `responses` to reuse replies of reads.
+    """
+
+    def __init__(I, server, session=None, cache=None, tokens=None, codec=None, pool=10,
+                 coalesce=False, responses=None):
+        BaseApi.__init__(I, server, cache, codec)
+        if session is None:
+            session = requests.session()
+            session.headers['Content-Type'] = 'application/json-rpc'
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        I._session = session
+        I.pool = pool
+        I.tokens = tokens
+        I._credentials = None
+        I._login_lock = threading.Lock()
+        I.flights = SingleFlight() if coalesce else None
+        I.responses = responses
+
+
+    def login(I, user, password):
+        """
+        Return true if able to authenticate, false otherwise.  Session
+        key is saved in this object for future requests.
+
+        With a token store, a session key saved by another process with
+        the same credentials is reused without calling user.login.  When
+        the server reports it expired, login happens transparently (once
+        for all processes sharing the store) and the call is retried.
+        """
+        I._credentials = (user, password)
+        if I.tokens is not None:
+            I._auth = I.tokens.get(I._token_key())
+            if I._auth:
+                return True
+        return I._login()
+
+    def _login(I):
+        I._auth = I._user_login()
+        if I._auth and I.tokens is not None:
+            I.tokens.set(I._token_key(), I._auth)
+        return bool(I._auth)
+
+    def _relogin(I, stale):
+        """
+        Replace `stale` session key, unless another process sharing the
+        token store already did.  Return true if a valid key is set.
+        """
+        if I.tokens is None:
+            return I._login()
+        key = I._token_key()
+        renew = getattr(I.tokens, 'renew', None)
+        if renew is not None:
+            I._auth = renew(key, stale, I._user_login)
+            return bool(I._auth)
+        token = I.tokens.get(key)
+        if token and token != stale:
+            I._auth = token
+            return True
+        return I._login()
+
+    def _user_login(I):
+        """
+        Return a new session key, or None if the credentials are refused.
+        """
+        user, password = I._credentials
+        I._auth = None
+        try:
+            return I.response('user.login', user=user, password=password).get('result')
+        except ApiException as e:
+            if e.code != ApiException.FAILED_AUTH:
+                raise
+        return None
+
+    def _token_key(I):
+        # Keyed by credentials, so a wrong password never gets a saved key.
+        user, password = I._credentials
+        digest = hashlib.sha256('\0'.join((I._endpoint, user, password)).encode('utf-8')).hexdigest()
+        return "{} {} {}".format(I._endpoint, user, digest)
+
+    def response(I, method, *args, **params):
+        """
+        Get "raw" response from zabbix server.  Params are given as
+        keywords, or as a single list for methods taking an array, ie:
+        `response('item.update', [dict(itemid='1', status=1), ...])`.
+
+        [Zabbix API Docs](https://www.zabbix.com/documentation/2.2/manual/api/reference)
+        """
+        responses = I.responses
+        if not method.endswith('.get'):
+            reply = I._request(method, args, params)
+            if responses is not None:
+                responses.written(method)
+            return reply
+        sent = args[0] if args else params
+        cached = responses is not None and responses.cacheable(method, sent)
+        if not cached and I.flights is None:
+            return I._request(method, args, params)
+        key = json.dumps([method, args, params], sort_keys=True, default=str)
+        if cached:
+            reply = responses.get(key)
+            if reply is not None:
+                return reply
+        def fetch():
+            # Cached by the caller making the request, unless a write
+            # happened while it ran.
+            generation = responses.generation(method) if cached else None
+            reply = I._request(method, args, params)
+            if cached:
+                responses.put(key, method, sent, reply, generation)
+            return reply
+        if I.flights is not None:
+            return I.flights.do(key, fetch)
+        return fetch()
+
+    def _request(I, method, args, params):
+        """
+        Return reply of a call, logging in again once if the session
+        expired.
+        """
+        auth = I._auth
+        try:
+            return I._response(method, args, params)
+        except ApiException as e:
+            if not e.expired or method == 'user.login' or I._credentials is None:
+                raise
+            with I._login_lock:
+                # Another thread may have logged in again meanwhile.
+                if I._auth == auth and not I._relogin(auth):
+                    raise
+        return I._response(method, args, params)
+
+    def _response(I, method, args, params):
+        stats = CallStats(method)
+        start = timer()
+        try:
+            return I._check(I._post(I._payload(method, params, args), stats))
+        except Exception as e:
+            stats.error = e
+            raise
+        finally:
+            stats.latency = timer() - start
+            I._emit(stats)
+
+
+    def batch(I, size=100):
+        """
+        Return a `Batch` that queues calls and sends them to the server
+        as JSON-RPC batches of at most `size` calls each.  Use as a
+        context manager so queued calls are sent on exit::
+
+            with api.batch() as batch:
+                calls = [batch.response('host.get', filter=dict(name=n)) for n in names]
+            hosts = [call.result for call in calls]
+        """
+        return Batch(I, size)
+
+
+    def map(I, calls, workers=None, ordered=True):
+        """
+        Run `(method, params)` pairs on at most `workers` threads
+        (default `pool`) and generate a `BatchCall` for each, in the order
+        of `calls` or, if not `ordered`, as they complete.  `params` is a
+        dict of keywords or a list for methods taking an array.  Errors
+        are raised by each call's `result`, not by `map`::
+
+            calls = [('history.get', dict(itemids=id, history=0)) for id in ids]
+            for call in api.map(calls):
+                rows = call.result
+        """
+        workers = workers or I.pool
+        calls = iter(calls)
+        with ThreadPoolExecutor(workers) as executor:
+            # Keep a bounded window of calls submitted, so `calls` may be
+            # a long generator.
+            pending = deque() if ordered else set()
+            submit = pending.append if ordered else pending.add
+            for method, params in itertools.islice(calls, 2 * workers):
+                submit(executor.submit(I._call, method, params))
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    pending.difference_update(done)
+                for future in done:
+                    for method, params in itertools.islice(calls, 1):
+                        submit(executor.submit(I._call, method, params))
+                    yield future.result()
+
+    def _call(I, method, params):
+        call = BatchCall(method, None)
+        try:
+            if isinstance(params, (list, tuple)):
+                call._reply = I.response(method, list(params))
+            else:
+                call._reply = I.response(method, **params)
+        except Exception as e:
+            call._error = e
+        return call
+
+
+    def _post(I, payload, stats):
+        """
+        Send `payload` (a request or list of requests) and return the
+        decoded reply.  Sizes and decode time are recorded in `stats`.
+        """
+        data = I.codec.dumps(payload)
+        response = I._session.post(I._endpoint, data=data)
+        body = response.content
+        stats.request_bytes = len(data)
+        stats.response_bytes = len(body)
+        start = timer()
+        try:
+            return I._decode(body)
+        finally:
+            stats.decode_time = timer() - start
+
+
+    def iter_response(I, method, *args, **params):
+        """
+        Generate the elements of the `result` of a call as they are
+        received, so memory does not grow with the size of the reply::
+
+            for row in api.iter_response('history.get', itemids=..., history=0):
+                ...
+
+        Errors are raised as `ApiException`, as by `response`.
+        """
+        stats = CallStats(method)
+        start = timer()
+        data = I.codec.dumps(I._payload(method, params, args))
+        stats.request_bytes = len(data)
+        def counted(chunks):
+            for chunk in chunks:
+                stats.response_bytes += len(chunk)
+                yield chunk
+        response = None
+        try:
+            response = I._session.post(I._endpoint, data=data, stream=True)
+            for row in iter_result(counted(response.iter_content(65536)), I.codec.loads, I._check):
+                yield row
+        except ValueError as e:
+            stats.error = ApiException(ApiException.INVALID_REPLY, 'invalid json', str(e))
+            raise stats.error
+        except Exception as e:
+            stats.error = e
+            raise
+        finally:
+            # Give the connection back to the pool, also when the caller
+            # stops early.
+            if response is not None:
+                response.close()
+            stats.latency = timer() - start
+            I._emit(stats)
+
+
+class BatchCall(object):
+    """
+    A call queued in a `Batch`, or run by `Api.map`.  Its reply is
+    available once the batch has been sent.
+    """
+
+    def __init__(I, method, payload):
+        I.method = method
+        I.payload = payload
+        I._reply = None
+        I._error = None
+
+    @property
+    def done(I):
+        """
+        True once a reply (or error) has been received.
+        """
+        return I._reply is not None or I._error is not None
+
+    @property
+    def reply(I):
+        """
+        The "raw" reply as returned by `Api.response`.  Raises the
+        exception of this call if it failed.
+        """
+        if I._error is not None:
+            raise I._error
+        if I._reply is None:
+            raise ApiException(ApiException.INVALID_REPLY, 'batch not sent', I.method)
+        return I._reply
+
+    @property
+    def result(I):
+        """
+        The `result` member of the reply.
+        """
+        return I.reply.get('result')
+
+    def __repr__(I):
+        return "{}[{}]".format(I.__class__.__name__, I.method)
+
+
+class Batch(object):
+    """
+    Queue of calls sent to the server as JSON-RPC batches.  Replies are
+    matched back to their `BatchCall` by request id.
+    """
+
+    def __init__(I, api, size=100):
+        I._api = api
+        I.size = size
+        I._queue = []
+
+    def response(I, method, *args, **params):
+        """
+        Queue a call and return its `BatchCall`.  The queue is sent as
+        soon as it holds `size` calls.
+        """
+        call = BatchCall(method, I._api._payload(method, params, args))
+        I._queue.append(call)
+        if len(I._queue) >= I.size:
+            I.send()
+        return call
+
+    def send(I):
+        """
+        Send all queued calls.
+        """
+        queue, I._queue = I._queue, []
+        if not queue:
+            return
+        stats = CallStats('batch')
+        start = timer()
+        try:
+            reply = I._api._post([call.payload for call in queue], stats)
+        except Exception as e:
+            stats.error = e
+            raise
+        finally:
+            stats.latency = timer() - start
+            I._api._emit(stats)
+        if isinstance(reply, dict):
+            # A single error object is returned when the whole batch is rejected.
+            try:
+                I._api._check(reply)
+                error = ApiException(ApiException.INVALID_REPLY, 'unexpected reply', reply)
+            except ApiException as e:
+                error = e
+            for call in queue:
+                call._error = error
+            return
+        calls = dict((call.payload['id'], call) for call in queue)
+        for item in reply:
+            if not isinstance(item, dict):
+                raise ApiException(ApiException.INVALID_REPLY, 'unexpected reply', item)
+            call = calls.pop(item.get('id'), None)
+            if call is None:
+                continue
+            try:
+                call._reply = I._api._check(item)
+            except ApiException as e:
+                call._error = e
+            else:
+                if I._api.responses is not None:
+                    I._api.responses.written(call.method)
+        for call in calls.values():
+            call._error = ApiException(ApiException.INVALID_REPLY, 'missing reply', call.method)
+
+    def __enter__(I):
+        return I
+
+    def __exit__(I, kind, value, tb):
+        if kind is None:
+            I.send()
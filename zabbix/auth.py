@@ -0,0 +1,107 @@
+"""
+Storage of session keys shared between processes.
+
+A token store is any object with `get(key)`, `set(key, token)` and
+`delete(key)` methods, and optionally `renew(key, stale, login)` (see
+`FileTokenStore.renew`).  `Api` uses one to skip `user.login` when
+another process already has a session::
+
+    api = Api('http://zabbix', tokens=FileTokenStore('~/.zabbix-tokens'))
+    api.login('user', 'pass')
+"""
+
+import os
+import json
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__all__ = [
+    'FileTokenStore',
+]
+
+
+class FileTokenStore(object):
+    """
+    Session keys kept in a JSON file readable only by its owner.  Access
+    is serialized with a lock file next to it (where `fcntl` exists).
+    """
+
+    def __init__(I, path):
+        I.path = os.path.expanduser(path)
+
+
+    def get(I, key):
+        """
+        Return token saved for `key`, or None.
+        """
+        with I._locked(fcntl and fcntl.LOCK_SH):
+            return I._read().get(key)
+
+    def set(I, key, token):
+        """
+        Save `token` for `key`.
+        """
+        with I._locked(fcntl and fcntl.LOCK_EX):
+            tokens = I._read()
+            tokens[key] = token
+            I._write(tokens)
+
+    def delete(I, key):
+        """
+        Forget the token of `key`.
+        """
+        with I._locked(fcntl and fcntl.LOCK_EX):
+            tokens = I._read()
+            if tokens.pop(key, None) is not None:
+                I._write(tokens)
+
+    def renew(I, key, stale, login):
+        """
+        Return the token of `key` if it is no longer `stale`, as another
+        process renewed it.  Otherwise save and return the token returned
+        by `login()`, or forget the token and return None if that fails.
+        The store stays locked meanwhile, so only one process logs in.
+        """
+        with I._locked(fcntl and fcntl.LOCK_EX):
+            tokens = I._read()
+            token = tokens.get(key)
+            if token and token != stale:
+                return token
+            token = login()
+            if token:
+                tokens[key] = token
+            else:
+                tokens.pop(key, None)
+            I._write(tokens)
+            return token
+
+
+    @contextmanager
+    def _locked(I, mode):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(I.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            os.close(fd)
+
+    def _read(I):
+        try:
+            with open(I.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(I, tokens):
+        tmp = I.path + '.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(tokens, f)
+        os.rename(tmp, I.path)
@@ -0,0 +1,346 @@
+"""
+Client-side caching of Zabbix objects and replies, and coalescing of calls.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+__all__ = [
+    'ObjectCache',
+    'ResponseCache',
+    'SingleFlight',
+]
+
+
+class ObjectCache(object):
+    """
+    Identity map of `ApiObject`s keyed by class and id, with secondary
+    keys (such as `name`) for lookups.  Entries expire after a per-class
+    TTL and the least recently used ones are evicted once `maxsize` are
+    held.  Safe to share between threads::
+
+        api = Api('http://zabbix', cache=ObjectCache(ttl=300, ttls={Item: 60}))
+    """
+
+    def __init__(I, maxsize=10000, ttl=300, ttls=None, clock=timer):
+        I.maxsize = maxsize
+        I.ttl = ttl
+        I.ttls = dict(ttls or {})
+        I._clock = clock
+        I._entries = OrderedDict()  # (class, id) -> (expires, obj, secondary keys)
+        I._keys = {}                # (class, key, val) -> id
+        I._lock = threading.RLock()
+        I.hits = 0
+        I.misses = 0
+        I.evictions = 0
+
+
+    def get(I, C, id):
+        """
+        Return cached `C` with `id`, or None if not cached or expired.
+        """
+        with I._lock:
+            entry = I._entries.pop((C, id), None)
+            if entry is None or entry[0] < I._clock():
+                I.misses += 1
+                return None
+            I._entries[(C, id)] = entry
+            I.hits += 1
+            return entry[1]
+
+    def lookup(I, C, **keys):
+        """
+        Return cached `C` by a secondary key, ie: `lookup(Host, name='MyHost')`.
+        """
+        with I._lock:
+            ((key, val),) = keys.items()
+            id = I._keys.get((C, key, val))
+            if id is None:
+                I.misses += 1
+                return None
+            return I.get(C, id)
+
+    def peek(I, C, id):
+        """
+        Like `get` but without touching recency or statistics.
+        """
+        with I._lock:
+            entry = I._entries.get((C, id))
+            if entry is None or entry[0] < I._clock():
+                return None
+            return entry[1]
+
+    def put(I, obj, **keys):
+        """
+        Cache `obj`, also reachable by the given secondary `keys`.
+        """
+        with I._lock:
+            C = obj.__class__
+            old = I._entries.pop((C, obj.id), None)
+            secondary = set(old[2]) if old else set()
+            for key, val in keys.items():
+                I._keys[(C, key, val)] = obj.id
+                secondary.add((C, key, val))
+            I._entries[(C, obj.id)] = (I._clock() + I.ttls.get(C, I.ttl), obj, secondary)
+            while len(I._entries) > I.maxsize:
+                _, entry = I._entries.popitem(last=False)
+                I._forget_keys(entry)
+                I.evictions += 1
+            return obj
+
+
+    def invalidate(I, obj=None, C=None, id=None):
+        """
+        Drop `obj`, or the `C` with `id`, or every `C` when no id given.
+        """
+        with I._lock:
+            if obj is not None:
+                C, id = obj.__class__, obj.id
+            if id is not None:
+                entry = I._entries.pop((C, id), None)
+                if entry is not None:
+                    I._forget_keys(entry)
+            elif C is not None:
+                for key in [k for k in I._entries if k[0] is C]:
+                    I._forget_keys(I._entries.pop(key))
+
+    def clear(I):
+        """
+        Drop everything.
+        """
+        with I._lock:
+            I._entries.clear()
+            I._keys.clear()
+
+
+    def stats(I):
+        """
+        Return hit/miss/eviction counters and current size.
+        """
+        with I._lock:
+            return dict(
+                hits = I.hits,
+                misses = I.misses,
+                evictions = I.evictions,
+                size = len(I._entries),
+            )
+
+    def __len__(I):
+        return len(I._entries)
+
+    def _forget_keys(I, entry):
+        obj = entry[1]
+        for key in entry[2]:
+            if I._keys.get(key) == obj.id:
+                del I._keys[key]
+
+
+class ResponseCache(object):
+    """
+    Replies of `*.get` calls, keyed by method and parameters, for use by
+    `Api.response`::
+
+        api = Api('http://zabbix', responses=ResponseCache(ttls={'hostgroup.get': 600}))
+
+    Replies expire after the TTL of their method (`ttl` unless given in
+    `ttls`; 0 is not cached).  History and trends of a window that ended
+    more than `lag` seconds ago cannot change, so they only leave the
+    cache when evicted.  The least recently used replies are evicted once
+    `maxsize` are held.  A successful write (`create`, `update`,
+    `massadd`, ...) drops the cached replies of its object type and of
+    the `RELATED` ones, and a read that was running meanwhile is not
+    cached (see `generation`).
+
+    Replies are shared and must not be modified.
+    """
+
+    IMMUTABLE = ('history.get', 'trend.get')
+    WRITES = ('create', 'update', 'delete', 'massadd', 'massremove', 'massupdate')
+
+    # Map[type -> types] whose replies embed objects of a type (ie:
+    # hostgroup.get with selectHosts, host.get with selectItems) or are
+    # filtered by them (ie: item.get with groupids), so writes of that
+    # type invalidate them too.
+    RELATED = {
+        'host': ('hostgroup', 'item', 'trigger'),
+        'hostgroup': ('host', 'item', 'trigger'),
+        'item': ('host', 'trigger'),
+        'trigger': ('host', 'item'),
+    }
+
+    def __init__(I, maxsize=1000, ttl=60, ttls=None, lag=60, clock=timer, now=time.time):
+        I.maxsize = maxsize
+        I.ttl = ttl
+        I.ttls = dict(ttls or {})
+        I.lag = lag
+        I._clock = clock
+        I._now = now
+        I._entries = OrderedDict()  # key -> (expires, method, reply)
+        I._generations = {}  # type -> number of invalidations, None -> of all types
+        I._lock = threading.Lock()
+        I.hits = 0
+        I.misses = 0
+        I.evictions = 0
+        I.invalidations = 0
+
+
+    def cacheable(I, method, params):
+        """
+        True if replies of `method` called with `params` are cached.
+        """
+        return method.endswith('.get') and I._ttl(method, params) > 0
+
+    def get(I, key):
+        """
+        Return cached reply for `key`, or None.
+        """
+        with I._lock:
+            entry = I._entries.pop(key, None)
+            if entry is None or entry[0] < I._clock():
+                I.misses += 1
+                return None
+            I._entries[key] = entry
+            I.hits += 1
+            return entry[2]
+
+    def generation(I, method):
+        """
+        Return a token that changes whenever replies of `method` are
+        invalidated.  Taken before a read and passed to `put`, it keeps a
+        reply that may predate a write out of the cache.
+        """
+        with I._lock:
+            return I._generation(method)
+
+    def put(I, key, method, params, reply, generation=None):
+        """
+        Cache `reply` of `method` called with `params` under `key`, unless
+        replies of `method` were invalidated since `generation` was taken.
+        """
+        with I._lock:
+            if generation is not None and generation != I._generation(method):
+                return reply
+            I._entries.pop(key, None)
+            I._entries[key] = (I._clock() + I._ttl(method, params), method, reply)
+            while len(I._entries) > I.maxsize:
+                I._entries.popitem(last=False)
+                I.evictions += 1
+        return reply
+
+    def written(I, method):
+        """
+        Invalidate replies made stale by a successful call of `method`.
+        """
+        kind, _, verb = method.partition('.')
+        if verb in I.WRITES:
+            I.invalidate(kind)
+            for related in I.RELATED.get(kind, ()):
+                I.invalidate(related)
+
+    def invalidate(I, kind=None):
+        """
+        Drop cached replies of object type `kind` (ie: 'host'), or all.
+        """
+        with I._lock:
+            I._generations[kind] = I._generations.get(kind, 0) + 1
+            if kind is None:
+                keys = list(I._entries)
+            else:
+                prefix = kind + '.'
+                keys = [key for key, entry in I._entries.items() if entry[1].startswith(prefix)]
+            for key in keys:
+                del I._entries[key]
+            I.invalidations += len(keys)
+
+    def stats(I):
+        """
+        Return hit/miss/eviction/invalidation counters and current size.
+        """
+        with I._lock:
+            return dict(
+                hits = I.hits,
+                misses = I.misses,
+                evictions = I.evictions,
+                invalidations = I.invalidations,
+                size = len(I._entries),
+            )
+
+    def __len__(I):
+        return len(I._entries)
+
+    def _generation(I, method):
+        return (I._generations.get(None, 0), I._generations.get(method.partition('.')[0], 0))
+
+    def _ttl(I, method, params):
+        if method in I.IMMUTABLE and isinstance(params, dict):
+            till = params.get('time_till')
+            if till is not None and int(till) < I._now() - I.lag:
+                return float('inf')
+        return I.ttls.get(method, I.ttl)
+
+
+class SingleFlight(object):
+    """
+    Coalescing of identical calls made at the same time: while a call
+    for a key is running, callers asking for the same key wait for it and
+    share its result (or exception) instead of making their own.
+    """
+
+    def __init__(I):
+        I._lock = threading.Lock()
+        I._flights = {}  # key -> _Flight
+        I.hits = 0
+        I.misses = 0
+
+
+    def do(I, key, fn):
+        """
+        Return `fn()`, or the result of the call to `fn` already running
+        for `key`.
+        """
+        with I._lock:
+            flight = I._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = I._flights[key] = _Flight()
+                I.misses += 1
+            else:
+                I.hits += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with I._lock:
+                del I._flights[key]
+            flight.done.set()
+
+    def stats(I):
+        """
+        Return counts of calls shared (`hits`) and made (`misses`), and
+        of calls running.
+        """
+        with I._lock:
+            return dict(
+                hits = I.hits,
+                misses = I.misses,
+                inflight = len(I._flights),
+            )
+
+
+class _Flight(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(I):
+        I.done = threading.Event()
+        I.result = None
+        I.error = None
@@ -0,0 +1,124 @@
+"""
+JSON encoding and decoding of requests and replies.
+
+A codec is any object with `dumps(obj)` returning str or bytes and
+`loads(bytes)`.  `default_codec` picks [orjson](https://github.com/ijl/orjson)
+when installed and falls back to the standard library.
+"""
+
+import re
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__all__ = [
+    'JsonCodec',
+    'OrjsonCodec',
+    'default_codec',
+    'iter_result',
+]
+
+
+class JsonCodec(object):
+    """
+    Standard library `json`.
+    """
+
+    def dumps(I, obj):
+        return json.dumps(obj)
+
+    def loads(I, data):
+        return json.loads(data)
+
+
+class OrjsonCodec(object):
+    """
+    `orjson`, encoding to and decoding from bytes without intermediate str.
+    """
+
+    def dumps(I, obj):
+        return orjson.dumps(obj)
+
+    def loads(I, data):
+        return orjson.loads(data)
+
+
+def default_codec():
+    """
+    Return the fastest codec available.
+    """
+    if orjson is not None:
+        return OrjsonCodec()
+    return JsonCodec()
+
+
+# Characters changing the structure of a JSON text, and the rest of a
+# string after its opening quote.
+STRUCTURE = re.compile(br'[\[\]{},"]')
+STRING_END = re.compile(br'(?:[^"\\]|\\.)*"', re.S)
+
+
+def iter_result(chunks, loads, check):
+    """
+    Generate elements of the `result` array of a JSON-RPC reply received
+    as `chunks` of bytes, each decoded with `loads` as soon as it is
+    complete.  Only the element being received is kept in memory.
+
+    Any other reply (an error, or a result that is not an array) is read
+    whole and passed to `check`, which raises for errors.
+    """
+    chunks = iter(chunks)
+    buf = b''
+    pos = 0
+    depth = 0
+    key = None
+    start = None  # start of the current element once inside `result`
+    while True:
+        match = STRUCTURE.search(buf, pos)
+        if match is not None and buf[match.start():match.end()] == b'"':
+            end = STRING_END.match(buf, match.end())
+            if end is not None:
+                if depth == 1:
+                    key = buf[match.end():end.end() - 1]
+                pos = end.end()
+                continue
+            match = None
+        if match is None:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            if start is not None:
+                buf, pos, start = buf[start:], pos - start, 0
+            buf += chunk
+            continue
+        char = buf[match.start():match.end()]
+        pos = match.end()
+        if char in b'[{':
+            if depth == 1 and start is None:
+                if key != b'result' or char != b'[':
+                    break
+                start = pos
+            depth += 1
+        elif char in b']}':
+            depth -= 1
+            if start is not None and depth == 1:
+                if buf[start:match.start()].strip():
+                    yield loads(buf[start:match.start()])
+                for chunk in chunks:
+                    pass  # read the (short) rest of the reply
+                return
+        elif char == b',' and start is not None and depth == 2:
+            yield loads(buf[start:match.start()])
+            start = pos
+    if start is not None:
+        raise ValueError('truncated reply')
+    reply = check(loads(buf + b''.join(chunks)))
+    result = reply.get('result')
+    if isinstance(result, list):
+        for row in result:
+            yield row
+    else:
+        yield result
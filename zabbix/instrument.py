@@ -0,0 +1,120 @@
+"""
+Instrumentation of calls to the Zabbix API.
+
+Every call made by an `Api` is described by a `CallStats` which is passed
+to each hook registered with `Api.instrument`.  A hook is any callable
+taking a `CallStats`.  `Metrics` is a hook that aggregates them::
+
+    metrics = api.instrument(Metrics())
+    ...
+    metrics.snapshot()['host.get']['calls']
+
+or, to only measure the calls of one block of code in the calling thread::
+
+    with api.measure() as metrics:
+        ...
+    print(metrics.snapshot())
+"""
+
+import threading
+
+__all__ = [
+    'CallStats',
+    'Metrics',
+]
+
+
+class CallStats(object):
+    """
+    Measurements of a single request to the server.  A batch request is
+    reported once, with method `batch`.
+    """
+
+    __slots__ = (
+        'method',
+        'latency',
+        'request_bytes',
+        'response_bytes',
+        'decode_time',
+        'error',
+    )
+
+    def __init__(I, method):
+        I.method = method
+        I.latency = 0.0
+        I.request_bytes = 0
+        I.response_bytes = 0
+        I.decode_time = 0.0
+        I.error = None
+
+    def __repr__(I):
+        return "{}[{}: {:.3f}s]".format(I.__class__.__name__, I.method, I.latency)
+
+
+class Metrics(object):
+    """
+    Aggregate `CallStats` per method: call and error counts, latency
+    histogram, request/response sizes and decode time.  Safe to share
+    between threads.
+    """
+
+    # Upper bounds (seconds) of the latency histogram buckets.
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+    def __init__(I):
+        I._methods = {}
+        I._lock = threading.Lock()
+
+    def __call__(I, stats):
+        with I._lock:
+            I._add(stats)
+
+    def _add(I, stats):
+        m = I._methods.get(stats.method)
+        if m is None:
+            m = I._methods[stats.method] = dict(
+                calls = 0,
+                errors = 0,
+                error_codes = {},
+                latency = 0.0,
+                latency_max = 0.0,
+                histogram = [0] * len(I.BUCKETS),
+                request_bytes = 0,
+                response_bytes = 0,
+                decode_time = 0.0,
+            )
+        m['calls'] += 1
+        m['latency'] += stats.latency
+        m['latency_max'] = max(m['latency_max'], stats.latency)
+        for i, bound in enumerate(I.BUCKETS):
+            if stats.latency <= bound:
+                m['histogram'][i] += 1
+                break
+        m['request_bytes'] += stats.request_bytes
+        m['response_bytes'] += stats.response_bytes
+        m['decode_time'] += stats.decode_time
+        if stats.error is not None:
+            m['errors'] += 1
+            code = getattr(stats.error, 'code', None)
+            m['error_codes'][code] = m['error_codes'].get(code, 0) + 1
+
+    def snapshot(I):
+        """
+        Return Map[method -> dict] of the measurements so far.  The
+        `histogram` is a Map[bucket upper bound -> count].
+        """
+        snap = {}
+        with I._lock:
+            for method, m in I._methods.items():
+                m = dict(m)
+                m['error_codes'] = dict(m['error_codes'])
+                m['histogram'] = dict(zip(I.BUCKETS, m['histogram']))
+                snap[method] = m
+        return snap
+
+    def reset(I):
+        """
+        Forget all measurements.
+        """
+        with I._lock:
+            I._methods = {}
@@ -0,0 +1,230 @@
+"""
+Local in-memory mirror of the inventory.
+"""
+
+import json
+import time
+from .objects import chunks
+from .objects.collection import Collection
+from .objects.resultset import ResultSet
+from .objects.host import Host
+from .objects.hostgroup import HostGroup
+from .objects.item import Item
+from .objects.trigger import Trigger
+
+__all__ = [
+    'Mirror',
+]
+
+
+class Mirror(object):
+    """
+    Host groups, hosts, items and triggers loaded once and then kept
+    current by incremental syncs, so questions are answered from memory::
+
+        mirror = Mirror(api, max_age=60)
+        group = mirror.by_name(HostGroup, 'X')
+        [host for host in group.hosts.values()
+         if 'Y' in host.items and host.items['Y'].status.val == 1]
+
+    Relations between mirrored objects (`HostGroup.hosts`, `Host.groups`,
+    `Host.items`, `Host.triggers()`, `Item.hosts()`) are linked without
+    requests.
+
+    A sync asks for the ids and a few `TRACK`ed properties of every
+    object, and fetches in full only the objects that are new or whose
+    tracked properties changed.  Untracked properties (ie:
+    `Item.lastvalue`) are only as fresh as the last full fetch of their
+    object.  With `max_age`, lookups sync first if the last sync is older
+    than `max_age` seconds.
+    """
+
+    # Properties compared to find changed objects, per class.
+    TRACK = {
+        HostGroup: ('name', 'flags'),
+        Host: ('host', 'name', 'status', 'available'),
+        Item: ('hostid', 'key_', 'name', 'status', 'state', 'value_type', 'units', 'delay'),
+        Trigger: ('description', 'expression', 'priority', 'status', 'state', 'value', 'lastchange'),
+    }
+
+    # Properties indexed for `find`, per class.  Only tracked properties,
+    # so the indexes do not go stale.
+    INDEXES = {
+        HostGroup: ('name',),
+        Host: ('name', 'status', 'available'),
+        Item: ('key_', 'hostid', 'status', 'state'),
+        Trigger: ('priority', 'status', 'value'),
+    }
+
+    # Other parameters of the requests for tracked properties, per class:
+    # relations to link, and no objects of templates.
+    PARAMS = {
+        Host: dict(selectGroups=['groupid']),
+        Item: dict(templated=False),
+        Trigger: dict(selectHosts=['hostid'], templated=False),
+    }
+
+    def __init__(I, api, classes=(HostGroup, Host, Item, Trigger), max_age=None, chunk=500, clock=time.time):
+        I._api = api
+        I.classes = tuple(classes)
+        I.max_age = max_age
+        I.chunk = chunk
+        I._clock = clock
+        I.objects = dict((C, {}) for C in I.classes)  # class -> Map[id -> object]
+        I._rows = dict((C, {}) for C in I.classes)    # class -> Map[id -> tracked row]
+        I.indexes = dict((C, Collection(C, indexes=I.INDEXES.get(C, ()))) for C in I.classes)
+        I.syncs = 0
+        I.last_sync = None
+        I.last = {}
+
+
+    def sync(I):
+        """
+        Bring the mirror up to date.  Return Map[API_NAME -> (added,
+        changed, removed)] counts.
+        """
+        counts = {}
+        start = I._clock()
+        with I._api.measure() as metrics:
+            for C in I.classes:
+                counts[C.API_NAME] = I._sync(C)
+        I._link()
+        I.syncs += 1
+        I.last_sync = I._clock()
+        calls = metrics.snapshot().values()
+        I.last = dict(
+            counts = counts,
+            seconds = I.last_sync - start,
+            calls = sum(m['calls'] for m in calls),
+            request_bytes = sum(m['request_bytes'] for m in calls),
+            response_bytes = sum(m['response_bytes'] for m in calls),
+        )
+        return counts
+
+    @property
+    def age(I):
+        """
+        Seconds since the last sync, or None if never synced.
+        """
+        if I.last_sync is None:
+            return None
+        return I._clock() - I.last_sync
+
+    def stats(I):
+        """
+        Return number of syncs, age, number of objects per API_NAME and
+        the cost of the last sync (requests, bytes, seconds and counts of
+        added/changed/removed objects).
+        """
+        return dict(
+            syncs = I.syncs,
+            age = I.age,
+            size = dict((C.API_NAME, len(I.objects[C])) for C in I.classes),
+            last = dict(I.last),
+        )
+
+
+    def get(I, C, id):
+        """
+        Return mirrored `C` with `id`, or None.
+        """
+        return I._objects(C).get(str(id))
+
+    def all(I, C):
+        """
+        `ResultSet` of mirrored `C`s.
+        """
+        return ResultSet(I._objects(C).values(), C)
+
+    def find(I, C, **props):
+        """
+        `ResultSet` of mirrored `C`s whose properties equal `props`, ie:
+        `find(Item, key_='agent.ping', status=[1, 2])`, answered from the
+        `INDEXES` when possible.  See `Collection.where`.
+        """
+        I._objects(C)
+        return I.indexes[C].where(**props)
+
+    def by_name(I, C, name):
+        """
+        Return the mirrored `C` named `name`, or None.
+        """
+        found = I.find(C, name=name)
+        return found[0] if found else None
+
+
+    def _objects(I, C):
+        if I.last_sync is None or (I.max_age is not None and I.age > I.max_age):
+            I.sync()
+        return I.objects[C]
+
+    def _sync(I, C):
+        """
+        Update mirrored `C`s.  Return (added, changed, removed) counts.
+        """
+        api = I._api
+        objects = I.objects[C]
+        index = I.indexes[C]
+        old = I._rows[C]
+        params = dict(I.PARAMS.get(C, {}), output=[C._ID] + list(I.TRACK[C]))
+        rows = {}
+        for row in api.response(C.API_NAME + '.get', **params).get('result'):
+            rows[row[C._ID]] = row
+        wanted = [id for id, row in rows.items()
+                  if id not in old or I._print(row) != I._print(old[id])]
+        for ids in chunks(wanted, I.chunk):
+            params = {C._ID + 's': ids}
+            for row in api.response(C.API_NAME + '.get', output='extend', **params).get('result'):
+                obj = C._from_reply(api, row)
+                if obj.id in objects:
+                    # Keep identity of objects already handed out.
+                    objects[obj.id]._update(obj)
+                else:
+                    objects[obj.id] = obj
+                    index.add(obj)
+        removed = [id for id in old if id not in rows]
+        for id in removed:
+            obj = objects.pop(id, None)
+            if obj is not None:
+                index.discard(obj)
+        I._rows[C] = rows
+        added = len([id for id in wanted if id not in old])
+        return (added, len(wanted) - added, len(removed))
+
+    @staticmethod
+    def _print(row):
+        return json.dumps(row, sort_keys=True)
+
+    def _link(I):
+        """
+        Point relations of mirrored objects at each other.
+        """
+        groups = I.objects.get(HostGroup)
+        hosts = I.objects.get(Host)
+        items = I.objects.get(Item)
+        triggers = I.objects.get(Trigger)
+        for group in (groups or {}).values():
+            group.hosts = {}
+        if hosts is None:
+            return
+        for id, host in hosts.items():
+            host._groups = {}
+            if items is not None:
+                host._items = {}
+            if triggers is not None:
+                host._trigger_list = []
+            for ref in I._rows[Host][id].get('groups', []):
+                group = groups.get(ref['groupid']) if groups is not None else None
+                if group is not None:
+                    host._groups[group.name.val] = group
+                    group.hosts[host.name.val] = host
+        for item in (items or {}).values():
+            host = hosts.get(item.hostid.val)
+            item._host_list = [host] if host is not None else []
+            if host is not None:
+                host._items[item.key_.val] = item
+        for id, trigger in (triggers or {}).items():
+            for ref in I._rows[Trigger][id].get('hosts', []):
+                host = hosts.get(ref['hostid'])
+                if host is not None:
+                    host._trigger_list.append(trigger)
@@ -3,46 +3,270 @@ Implementation of Zabbix API objects.
 """
 
 import json
+import calendar
 from datetime import datetime
 from ..api import ApiException
 
 __all__ = [
     'ApiObject',
+    'Property',
+    'PropSpec',
+    'prefetch',
+    'save_all',
 ]
 
 
+def chunks(seq, size):
+    """
+    Generate successive lists of at most `size` elements of `seq`.
+    """
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def prefetch(objs, *relations, **kwargs):
+    """
+    Load `relations` of many objects at once, ie::
+
+        prefetch(group.hosts.values(), 'items', 'triggers')
+
+    loads the items and triggers of all hosts in the group with one
+    request per relation (per `chunk` objects, default 500) instead of
+    one per host.
+    """
+    chunk = kwargs.pop('chunk', 500)
+    classes = {}
+    for obj in objs:
+        classes.setdefault(obj.__class__, []).append(obj)
+    for C, group in classes.items():
+        for relation in relations:
+            C._prefetch(group, relation, chunk)
+
+
+def save_all(objs, chunk=500):
+    """
+    Publish changes of many objects with as few requests as possible.
+    Objects are grouped by class and only dirty properties are sent:
+    objects sharing the very same changes as one `<type>.massupdate` when
+    the class supports it, the others as `<type>.update` calls of `chunk`
+    objects each.  Dirty flags are cleared for objects the server
+    confirms.  Return the list of saved objects.
+    """
+    saved = []
+    classes = {}
+    for obj in objs:
+        if obj._dirty:
+            classes.setdefault(obj.__class__, []).append(obj)
+    for C, group in classes.items():
+        api = group[0]._api
+        pending = [(obj, obj._dirty, obj._changes()) for obj in group]
+        if C.MASSUPDATE:
+            same = {}
+            for entry in pending:
+                same.setdefault(json.dumps(entry[2], sort_keys=True), []).append(entry)
+            pending = []
+            for entries in same.values():
+                if len(entries) == 1:
+                    pending.extend(entries)
+                    continue
+                for part in chunks(entries, chunk):
+                    params = dict(part[0][2])
+                    params[C.API_NAME + 's'] = [{C._ID: obj.id} for obj, bits, changes in part]
+                    saved.extend(C._confirm(part, api.response(C.API_NAME + '.massupdate', **params)))
+        for part in chunks(pending, chunk):
+            params = [dict(changes, **{C._ID: obj.id}) for obj, bits, changes in part]
+            saved.extend(C._confirm(part, api.response(C.API_NAME + '.update', params)))
+    return saved
+
+
 class ApiObject(object):
     """
     Base class for all Zabbix objects.
+
+    Each subclass's `PROPS` are compiled once into `PropSpec`s, shared
+    by all instances.  Instances only hold a list of values and a bitmap
+    of dirty properties.
     """
 
+    # Zabbix API object name, as in `<API_NAME>.get`
+    API_NAME = None
+
+    # True if the API has `<API_NAME>.massupdate`
+    MASSUPDATE = False
+
+    PROPS = {}
+
+    # Compiled `PROPS`: Map[name -> PropSpec], and the name of the id property
+    _SPECS = {}
+    _ID = None
+
     @property
     def id(I):
         return I._id
 
 
+    def __init_subclass__(C, **kwargs):
+        super(ApiObject, C).__init_subclass__(**kwargs)
+        C._SPECS = {}
+        for index, name in enumerate(sorted(C.PROPS)):
+            spec = PropSpec(name, index, **C.PROPS[name])
+            if spec.id:
+                C._ID = name
+            C._SPECS[name] = spec
+            setattr(C, name, spec)
+
+
     def __init__(I, api, **attrs):
+        I._setup(api)
+        specs = I._SPECS
+        for name, val in attrs.items():
+            spec = specs.get(name)
+            if spec is None:
+                pass # print("UNKNOWN PROP:", name, val)
+            else:
+                if spec.id:
+                    I._id = val
+                if val is not None:
+                    val = spec.coerce(val)
+                I._vals[spec.index] = val
+        I.process_refs(attrs)
+
+    @classmethod
+    def _from_reply(C, api, attrs):
+        """
+        Return a new object built from server data `attrs`.  Values are
+        only converted to their property's type, without the checks made
+        for user assignments, unless `api.validate_replies` is set.
+        """
+        if api.validate_replies:
+            return C(api, **attrs)
+        I = C.__new__(C)
+        I._setup(api)
+        specs = I._SPECS
+        vals = I._vals
+        for name, val in attrs.items():
+            spec = specs.get(name)
+            if spec is not None:
+                if spec.id:
+                    I._id = val
+                if val is not None and spec.load is not None:
+                    val = spec.load(val)
+                vals[spec.index] = val
+        I.process_refs(attrs)
+        return I
+
+    def _setup(I, api):
         I._id = None
         I._api = api
-        I._props = dict()
-        for name in attrs:
-            if name not in I.PROPS:
-                pass # print("UNKNOWN PROP:", name, attrs[name])
+        I._vals = [MISSING] * len(I._SPECS)
+        I._dirty = 0
+        I._siblings = None
+        I._watchers = None  # indexes to notify of changed values, see `Collection`
+
+    @property
+    def _props(I):
+        """
+        Map[name -> Property] of the properties this object holds.
+        """
+        return dict((name, Property(I, spec)) for name, spec in I._SPECS.items()
+                    if I._vals[spec.index] is not MISSING)
+
+    def _has(I, name):
+        """
+        True if property `name` was loaded for this object.
+        """
+        return I._vals[I._SPECS[name].index] is not MISSING
+
+    @classmethod
+    def query(C, api):
+        """
+        Return a `Query` over objects of this class.
+        """
+        return Query(C, api)
+
+    @classmethod
+    def _first(C, api, reply, *keys):
+        """
+        Return a new object from the first row of `reply`, or None.  The
+        object is cached, also reachable by the properties named in `keys`.
+        """
+        result = reply.get('result')
+        if not result:
+            return None
+        obj = C._from_reply(api, result[0])
+        if api.cache is not None:
+            api.cache.put(obj, **dict((key, getattr(obj, key).val) for key in keys))
+        return obj
+
+    @classmethod
+    def _by_names(C, api, names, chunk):
+        """
+        Return `ResultMap` name -> object (or None) for `names`, using
+        cached objects and fetching the others `chunk` names per request.
+        """
+        names = list(names)
+        found = {}
+        wanted = []
+        for name in set(names):
+            obj = C._cached(api, name=name)
+            if obj is None:
+                wanted.append(name)
             else:
-                spec = I.PROPS[name]
-                if spec.get('id'):
-                    I._id = attrs[name]
-                prop = Property(
-                    name = name,
-                    val = attrs[name],
-                    doc = spec.get('doc'),
-                    kind = spec.get('kind', str),
-                    readonly = spec.get('readonly'),
-                    vals = spec.get('vals'),
-                )
-                setattr(I, name, prop)
-                I._props[name] = prop
-        I.process_refs(attrs)
+                found[name] = obj
+        for names_chunk in chunks(wanted, chunk):
+            params = C._by_name_params(names_chunk)
+            for row in api.response(C.API_NAME + '.get', **params).get('result'):
+                obj = C._from_reply(api, row)
+                if api.cache is not None:
+                    api.cache.put(obj, name=obj.name.val)
+                found[obj.name.val] = obj
+        C._set_siblings(found.values())
+        return ResultMap(((name, found.get(name)) for name in names), C)
+
+    @classmethod
+    def _prefetch(C, objs, relation, chunk):
+        """
+        Load `relation` of all `objs` in bulk.  See `prefetch`.
+        """
+        raise ApiException(
+            ApiException.INVALID_VALUE,
+            'unknown relation',
+            "{}: {}".format(C.__name__, relation),
+        )
+
+    @staticmethod
+    def _set_siblings(objs):
+        """
+        Mark `objs` as loaded together, so relations accessed on one of
+        them are prefetched for all.
+        """
+        objs = list(objs)
+        if len(objs) > 1:
+            for obj in objs:
+                obj._siblings = objs
+
+    @classmethod
+    def _cached(C, api, **keys):
+        """
+        Return the cached object matching secondary `keys`, or None.
+        """
+        if api.cache is None:
+            return None
+        return api.cache.lookup(C, **keys)
+
+    @classmethod
+    def _ref(C, api, attrs):
+        """
+        Return the cached object for a reference found in another
+        object's reply, or a new one built from `attrs`.
+        """
+        if api.cache is not None:
+            if C._ID in attrs:
+                obj = api.cache.peek(C, attrs[C._ID])
+                if obj is not None:
+                    return obj
+        return C._from_reply(api, attrs)
 
     def process_refs(I, attrs):
         """
@@ -65,68 +289,150 @@ class ApiObject(object):
         Return all properties as a dict suitable for JSON.
         """
         d = dict()
-        for name in I._props:
-            prop = getattr(I, name)
-            if prop.kind == datetime:
-                d[name] = prop.val.isoformat()
+        for name, spec in I._SPECS.items():
+            val = I._vals[spec.index]
+            if val is MISSING:
+                continue
+            if spec.kind == datetime:
+                d[name] = val.isoformat()
             else:
-                d[name] = prop.val
-            
+                d[name] = val
+
         return d
 
     def save(I):
         """
-        Publish any changes to zabbix server.
+        Publish any changes to zabbix server.  Only dirty properties are
+        sent, and they are clean once the server confirms.  Return true
+        if the changes were saved.
+        """
+        return bool(save_all([I]))
+
+    def _update(I, obj):
+        """
+        Take the values and relations of `obj`, a newer copy of this
+        object, keeping watchers (notified of the values that changed).
+        """
+        vals = I._vals
+        watchers = I._watchers
+        I.__dict__.update(obj.__dict__)
+        I._watchers = watchers
+        if watchers:
+            for name, spec in I._SPECS.items():
+                old, new = vals[spec.index], I._vals[spec.index]
+                if old != new:
+                    for watcher in watchers:
+                        watcher._changed(I, name, old, new)
+
+    def _changes(I):
+        """
+        Map[name -> value to send] of dirty properties.
+        """
+        changes = dict()
+        if I._dirty:
+            for name, spec in I._SPECS.items():
+                if I._dirty & spec.bit:
+                    changes[name] = spec.dump(I._vals[spec.index])
+        return changes
+
+    @classmethod
+    def _confirm(C, entries, reply):
+        """
+        Clear the dirty flags sent for `entries` (object, dirty bits,
+        changes) whose ids are in the update `reply`, and return them.
         """
-        dirty = dict()
-        for name, prop in I._props.items():
-            if prop.dirty:
-                dirty[name] = prop.val
-        if dirty:
-            pass # I._api.response('update', params)
-        
+        ids = set(str(id) for id in (reply.get('result') or {}).get(C._ID + 's', []))
+        saved = []
+        for obj, bits, changes in entries:
+            if str(obj.id) in ids:
+                obj._dirty &= ~bits
+                saved.append(obj)
+        return saved
 
     def _repr_html_(I):
         rows = [
             '<table><thead><tr><th>Name</th><th>Value</th><th>Type</th><th>Dirty</th><th>Read-Only</th><th>Description</th></tr></thead><tbody>',
         ]
-        for name in sorted(I._props):
-            prop = I._props[name]
+        props = I._props
+        for name in sorted(props):
+            prop = props[name]
             val = prop.val
             if prop.vals and val in prop.vals:
                 val = "{}: {}".format(val, prop.vals[val])
             rows.append("<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>".format(
-                name, val, prop.kind.__name__, prop.dirty, prop.readonly, prop.__doc__))
+                name, val, prop.kind.__name__, prop.dirty, prop.readonly, prop.doc))
         rows.append('</tbody></table>')
 
         return '\n'.join(rows)
 
 
-class Property(object):
+class _Missing(object):
     """
-    Each attribute of an `ApiObject` is wrapped by this class.
+    Value of a property that was not loaded.
     """
 
-    @property
-    def val(I):
-        """
-        The property's actual value.
-        """
-        return I._val
+    def __repr__(I):
+        return 'MISSING'
 
-    @val.setter
-    def val(I, val):
+MISSING = _Missing()
+
+
+def _load_datetime(val):
+    return datetime.utcfromtimestamp(int(val))
+
+
+class _PropDoc(object):
+    """
+    `__doc__` of `PropSpec` and `Property`: the class docstring on the
+    class, the documentation of the property (`doc`) on instances.
+    """
+
+    def __init__(I, doc):
+        I._doc = doc
+
+    def __get__(I, obj, C=None):
+        if obj is None:
+            return I._doc
+        return obj.doc
+
+
+class PropSpec(object):
+    """
+    Compiled `PROPS` entry of an `ApiObject` class.  It is the class
+    attribute for that property and hands out `Property` views of each
+    instance's value.
+    """
+
+    __slots__ = ('name', 'index', 'bit', 'doc', 'kind', 'readonly', 'vals', 'id', 'load', '_xforms')
+    __doc__ = _PropDoc(__doc__)
+
+    def __init__(I, name, index, doc=None, kind=str, readonly=False, vals=None, id=False):
+        I.name = name
+        I.index = index
+        I.bit = 1 << index
+        I.doc = doc
+        I.kind = kind
+        I.readonly = readonly
+        I.vals = vals
+        I.id = id
+        if kind == datetime:
+            I._xforms = (int, datetime.utcfromtimestamp)
+        else:
+            I._xforms = (kind,)
+        # Conversion of trusted server data, None when already the right type.
+        if kind == datetime:
+            I.load = _load_datetime
+        elif kind == str:
+            I.load = None
+        else:
+            I.load = kind
+
+
+    def coerce(I, val):
         """
-        Set val, ensuring coerced to correct type and dirty flag set when changed.
+        Return `val` coerced to this property's type, raising
+        `ApiException` if not valid.
         """
-        if val == I._val:
-            return
-        if I.readonly and I._val is not None:
-            raise ApiException(
-                ApiException.INVALID_VALUE,
-                'read-only property',
-                "already defined as: {}".format(I._val),
-            )
         try:
             for xform in I._xforms:
                 val = xform(val)
@@ -148,31 +454,107 @@ class Property(object):
                 'invalid value',
                 "{}: {} not in {}".format(I.name, val, I.vals.keys()),
             )
-        I._val = val
-        I._dirty = True
+        return val
+
+    def assign(I, obj, val):
+        """
+        Set `obj`'s value, ensuring coerced to correct type and dirty flag
+        set when changed.
+        """
+        old = obj._vals[I.index]
+        if old is MISSING:
+            old = None
+        if val == old:
+            return
+        if I.readonly and old is not None:
+            raise ApiException(
+                ApiException.INVALID_VALUE,
+                'read-only property',
+                "already defined as: {}".format(old),
+            )
+        val = I.coerce(val)
+        obj._vals[I.index] = val
+        obj._dirty |= I.bit
+        if obj._watchers:
+            for watcher in obj._watchers:
+                watcher._changed(obj, I.name, old, val)
+
+    def dump(I, val):
+        """
+        Return `val` as sent to the server.
+        """
+        if I.kind == datetime and val is not None:
+            return calendar.timegm(val.utctimetuple())
+        return val
+
+
+    def __get__(I, obj, C=None):
+        if obj is None:
+            return I
+        if obj._vals[I.index] is MISSING:
+            raise AttributeError(I.name)
+        return Property(obj, I)
+
+    def __set__(I, obj, val):
+        I.assign(obj, val)
+
+    def __repr__(I):
+        return "{}[{}]".format(I.__class__.__name__, I.name)
+
+
+class Property(object):
+    """
+    Each attribute of an `ApiObject` is wrapped by this class.
+    """
+
+    __slots__ = ('_obj', '_spec')
+    __doc__ = _PropDoc(__doc__)
+
+    @property
+    def val(I):
+        """
+        The property's actual value.
+        """
+        return I._obj._vals[I._spec.index]
+
+    @val.setter
+    def val(I, val):
+        """
+        Set val, ensuring coerced to correct type and dirty flag set when changed.
+        """
+        I._spec.assign(I._obj, val)
 
     @property
     def dirty(I):
         """
         True if this property's value has been modified.
         """
-        return I._dirty
+        return bool(I._obj._dirty & I._spec.bit)
 
+    @property
+    def name(I):
+        return I._spec.name
 
-    def __init__(I, name='', doc='', val=None, kind=str, readonly=False, vals=None):
-        I.name = name
-        I.__doc__ = doc
-        if kind == datetime:
-            I._xforms = [int, datetime.utcfromtimestamp]
-        else:
-            I._xforms = [kind]
-        I.kind = kind
-        I.readonly = readonly
-        I.vals = vals
-        # Now set the value so that type checking happens
-        I._val = None
-        I.val = val 
-        I._dirty = False
+    @property
+    def doc(I):
+        return I._spec.doc
+
+    @property
+    def kind(I):
+        return I._spec.kind
+
+    @property
+    def readonly(I):
+        return I._spec.readonly
+
+    @property
+    def vals(I):
+        return I._spec.vals
+
+
+    def __init__(I, obj, spec):
+        I._obj = obj
+        I._spec = spec
 
 
     def __unicode__(I):
@@ -207,4 +589,8 @@ class Property(object):
                 </tr>
               </tbody>
             </table>
-        """.format(I.val, I.kind.__name__, I.dirty, I.readonly, I.__doc__)
+        """.format(I.val, I.kind.__name__, I.dirty, I.readonly, I.doc)
+
+# These import down here to work around circular imports.
+from .query import Query
+from .resultset import ResultMap
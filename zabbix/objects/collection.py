@@ -0,0 +1,180 @@
+"""
+Indexed collections of `ApiObject`s.
+"""
+
+from ..api import ApiException
+from . import MISSING
+from .resultset import ResultSet
+
+__all__ = [
+    'Collection',
+]
+
+
+class Collection(object):
+    """
+    Objects of class `C` with hash indexes on the properties named in
+    `indexes`, ie::
+
+        items = Collection(Item, host.items.values(), indexes=('key_', 'status'))
+        items.where(key_='system.cpu.load')
+        items.where(status=1, key_=['agent.ping', 'agent.version'])
+
+        triggers = Collection(Trigger, triggers, indexes=('priority',))
+        triggers.between('priority', 3)
+
+    Indexes follow changes of the objects' values.  Queries on other
+    properties scan all objects.
+    """
+
+    def __init__(I, C, objs=(), indexes=()):
+        I._C = C
+        I._check(indexes)
+        I._objs = {}     # object -> insertion number, for stable order
+        I._next = 0
+        I._indexes = dict((name, {}) for name in indexes)  # name -> Map[value -> Map[object -> None]]
+        I.update(objs)
+
+
+    def add(I, obj):
+        """
+        Add `obj`, if not already held.
+        """
+        if obj in I._objs:
+            return
+        I._objs[obj] = I._next
+        I._next += 1
+        for name, index in I._indexes.items():
+            if obj._has(name):
+                index.setdefault(obj._vals[obj._SPECS[name].index], {})[obj] = None
+        if obj._watchers is None:
+            obj._watchers = []
+        obj._watchers.append(I)
+
+    def update(I, objs):
+        """
+        Add all `objs`.
+        """
+        for obj in objs:
+            I.add(obj)
+
+    def discard(I, obj):
+        """
+        Remove `obj`, if held.
+        """
+        if I._objs.pop(obj, None) is None:
+            return
+        for name, index in I._indexes.items():
+            if obj._has(name):
+                I._unindex(index, obj._vals[obj._SPECS[name].index], obj)
+        obj._watchers.remove(I)
+
+
+    def where(I, **props):
+        """
+        `ResultSet` of objects whose properties equal `props`.  A list (or
+        other collection) of values matches any of them.
+        """
+        I._check(props)
+        found = None
+        scan = []
+        for name, val in props.items():
+            vals = I._values(name, val)
+            if name not in I._indexes:
+                scan.append((name, vals))
+                continue
+            index = I._indexes[name]
+            matches = set()
+            for val in vals:
+                matches.update(index.get(val, ()))
+            found = matches if found is None else found & matches
+            if not found:
+                return ResultSet([], I._C)
+        if found is None:
+            found = I._objs
+        if scan:
+            found = [obj for obj in found
+                     if all(obj._has(name) and obj._vals[obj._SPECS[name].index] in vals
+                            for name, vals in scan)]
+        return I._ordered(found)
+
+    def between(I, name, lo=None, hi=None):
+        """
+        `ResultSet` of objects whose property `name` is at least `lo` and at
+        most `hi` (either may be None).  On an indexed property only the
+        distinct values are compared, not each object.
+        """
+        I._check([name])
+        spec = I._C._SPECS[name]
+        lo, hi = [bound if bound is None or isinstance(bound, spec.kind) else spec.coerce(bound)
+                  for bound in (lo, hi)]
+        def within(val):
+            return val is not None and (lo is None or val >= lo) and (hi is None or val <= hi)
+        if name in I._indexes:
+            found = set()
+            for val, objs in I._indexes[name].items():
+                if within(val):
+                    found.update(objs)
+        else:
+            found = [obj for obj in I._objs if obj._has(name) and within(obj._vals[spec.index])]
+        return I._ordered(found)
+
+    def values(I, name):
+        """
+        Set of distinct values of property `name`.
+        """
+        I._check([name])
+        if name in I._indexes:
+            return set(I._indexes[name])
+        spec = I._C._SPECS[name]
+        return set(obj._vals[spec.index] for obj in I._objs if obj._has(name))
+
+    def __len__(I):
+        return len(I._objs)
+
+    def __iter__(I):
+        return iter(list(I._objs))
+
+    def __contains__(I, obj):
+        return obj in I._objs
+
+    def __repr__(I):
+        return "{}[{}: {}]".format(I.__class__.__name__, I._C.__name__, len(I._objs))
+
+
+    def _changed(I, obj, name, old, new):
+        """
+        Move `obj` to the bucket of its `new` value of property `name`.
+        """
+        index = I._indexes.get(name)
+        if index is None:
+            return
+        I._unindex(index, old, obj)
+        if new is not MISSING:
+            index.setdefault(new, {})[obj] = None
+
+    @staticmethod
+    def _unindex(index, val, obj):
+        objs = index.get(val)
+        if objs is not None:
+            objs.pop(obj, None)
+            if not objs:
+                del index[val]
+
+    def _values(I, name, val):
+        spec = I._C._SPECS[name]
+        if isinstance(val, (list, tuple, set, frozenset, range)):
+            return set(spec.coerce(v) for v in val)
+        return set([spec.coerce(val)])
+
+    def _ordered(I, objs):
+        return ResultSet(sorted(objs, key=I._objs.__getitem__), I._C)
+
+    def _check(I, names):
+        for name in names:
+            if name not in I._C.PROPS:
+                raise ApiException(
+                    ApiException.INVALID_VALUE,
+                    'unknown property',
+                    "{}: {}".format(I._C.__name__, name),
+                )
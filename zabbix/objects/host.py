@@ -1,6 +1,6 @@
 
 from datetime import datetime
-from . import ApiObject
+from . import ApiObject, chunks, prefetch
 
 
 class Host(ApiObject):
@@ -8,28 +8,45 @@ class Host(ApiObject):
     [Zabbix Host](https://www.zabbix.com/documentation/2.2/manual/api/reference/host/object)
     """
 
+    API_NAME = 'host'
+    MASSUPDATE = True
+
     @classmethod
     def by_name(C, api, name):
         """
-        Return a new `Host` with matching `name`.
+        Return the `Host` with matching `name`, from the api's cache if
+        possible.
+        """
+        obj = C._cached(api, name=name)
+        if obj is None:
+            obj = C._first(api, api.response('host.get', **C._by_name_params(name)), 'name')
+        return obj
+
+    @classmethod
+    def by_names(C, api, names, chunk=500):
         """
-        params = dict(
+        Return Map[name -> Host] for many `names` at once, `chunk` names
+        per request.  Names without a host map to None.  The hosts found
+        are also a `ResultSet`, see `ResultMap.found`.
+        """
+        return C._by_names(api, names, chunk)
+
+    @staticmethod
+    def _by_name_params(name):
+        return dict(
             output = 'extend',
             filter = dict(name=name),
             selectGroups = True,
         )
-        result = api.response('host.get', **params).get('result')
-        if not result:
-            return None
-        return C(api, **result[0])
 
 
     def process_refs(I, attrs):
         I._items = None
+        I._trigger_list = None
         I._groups = {}
         if 'groups' in attrs:
             for group in attrs['groups']:
-                I._groups[group['name']] = HostGroup(I._api, **group)
+                I._groups[group['name']] = HostGroup._ref(I._api, group)
                 
 
     @property
@@ -43,23 +60,72 @@ class Host(ApiObject):
     @property
     def items(I):
         """
-        Map[Item.key -> Item] of associated `Items`.
+        Map[Item.key -> Item] of associated `Items`.  Hosts loaded
+        together get their items in one request.
         """
+        if I._items is None and I._siblings:
+            prefetch(I._siblings, 'items')
         if I._items is None:
-            I._items = {}
-            for item in I._api.response('item.get', output='extend', hostids=I.id).get('result'):
-                I._items[item['key_']] = Item(I._api, **item)
+            I._set_items(I._api.response('item.get', **I._items_params()))
         return I._items
 
+    def _items_params(I):
+        return dict(output='extend', hostids=I.id)
+
+    def _set_items(I, reply):
+        I._items = {}
+        for item in reply.get('result'):
+            I._items[item['key_']] = Item._from_reply(I._api, item)
+
 
     def triggers(I):
         """
-        List of associated `Triggers`.
+        `ResultSet` of associated `Triggers`, as loaded by `prefetch` if
+        it was used.
         """
-        return [Trigger(I._api, **trigger) for trigger in
-                I._api.response('trigger.get', output='extend', hostids=I.id).get('result')]
+        if I._trigger_list is not None:
+            return ResultSet(I._trigger_list, Trigger)
+        return I._triggers(I._api.response('trigger.get', **I._triggers_params()))
+
+    def _triggers_params(I):
+        return dict(output='extend', hostids=I.id)
+
+    def _triggers(I, reply):
+        return ResultSet([Trigger._from_reply(I._api, trigger) for trigger in reply.get('result')], Trigger)
+
+    @classmethod
+    def _prefetch(C, hosts, relation, chunk):
+        # Relations are only set once every chunk was loaded, so a failed
+        # request leaves them to be loaded again.
+        if relation == 'items':
+            hosts = dict((host.id, host) for host in hosts if host._items is None)
+            items = dict((id, {}) for id in hosts)
+            for ids in chunks(hosts, chunk):
+                api = hosts[ids[0]]._api
+                for row in api.response('item.get', output='extend', hostids=ids).get('result'):
+                    items[row['hostid']][row['key_']] = Item._from_reply(api, row)
+            for id, host in hosts.items():
+                host._items = items[id]
+        elif relation == 'triggers':
+            hosts = dict((host.id, host) for host in hosts)
+            triggers = dict((id, []) for id in hosts)
+            for ids in chunks(hosts, chunk):
+                api = hosts[ids[0]]._api
+                params = dict(output='extend', hostids=ids, selectHosts=['hostid'])
+                for row in api.response('trigger.get', **params).get('result'):
+                    trigger = Trigger._from_reply(api, row)
+                    for ref in row.get('hosts', []):
+                        if ref['hostid'] in triggers:
+                            triggers[ref['hostid']].append(trigger)
+            for id, host in hosts.items():
+                host._trigger_list = triggers[id]
+        else:
+            super(Host, C)._prefetch(hosts, relation, chunk)
+
 
     def __repr__(I):
+        if not I._has('name'):
+            return super(Host, I).__repr__()
         return "{}[{}]".format(I.__class__.__name__, I.name.val)
 
 
@@ -254,3 +320,4 @@ class Host(ApiObject):
 from .hostgroup import HostGroup
 from .item import Item
 from .trigger import Trigger
+from .resultset import ResultSet
@@ -1,5 +1,5 @@
 
-from . import ApiObject
+from . import ApiObject, chunks
 
 
 class HostGroup(ApiObject):
@@ -7,6 +7,8 @@ class HostGroup(ApiObject):
     [Zabbix HostGroup](https://www.zabbix.com/documentation/2.2/manual/api/reference/hostgroup/object)
     """
 
+    API_NAME = 'hostgroup'
+
     @classmethod
     def create(C, api, name):
         """
@@ -22,24 +24,38 @@ class HostGroup(ApiObject):
     @classmethod
     def by_name(C, api, name):
         """
-        Return a new `HostGroup` with matching `name`.
+        Return the `HostGroup` with matching `name`, from the api's cache
+        if possible.
         """
-        params = dict(
+        obj = C._cached(api, name=name)
+        if obj is None:
+            obj = C._first(api, api.response('hostgroup.get', **C._by_name_params(name)), 'name')
+        return obj
+
+    @classmethod
+    def by_names(C, api, names, chunk=500):
+        """
+        Return Map[name -> HostGroup] for many `names` at once, `chunk`
+        names per request.  Names without a group map to None.  The
+        groups found are also a `ResultSet`, see `ResultMap.found`.
+        """
+        return C._by_names(api, names, chunk)
+
+    @staticmethod
+    def _by_name_params(name):
+        return dict(
             output = 'extend',
             filter = dict(name=name),
             selectHosts = True,
         )
-        result = api.response('hostgroup.get', **params).get('result')
-        if not result:
-            return None
-        return C(api, **result[0])
 
 
     def process_refs(I, attrs):
         I.hosts = {}
         if 'hosts' in attrs:
             for host in attrs['hosts']:
-                I.hosts[host['name']] = Host(I._api, **host)
+                I.hosts[host['name']] = Host._ref(I._api, host)
+            I._set_siblings(I.hosts.values())
 
 
     # def hosts(I):
@@ -54,16 +70,80 @@ class HostGroup(ApiObject):
         """
         True if successfully added `host` to this group.
         """
-        params = dict(
-            groups = [dict(groupid = I.id)],
-            hosts = [dict(hostid = host.id)],
-        )
-        reply = I._api.response('host.massadd', **params)
+        return I.add_hosts([host]) == [host]
+
+    def add_hosts(I, hosts, chunk=500):
+        """
+        Add many `hosts` to this group.  Return those the server confirmed.
+        """
+        return I.massadd(I._api, [I], hosts, chunk)
 
-        return [host.id] == reply['result'].get('hostids', [])
+    def remove_hosts(I, hosts, chunk=500):
+        """
+        Remove many `hosts` from this group.  Return those the server
+        confirmed.
+        """
+        return I.massremove(I._api, [I], hosts, chunk)
+
+
+    @classmethod
+    def massadd(C, api, groups, hosts, chunk=500):
+        """
+        Add all `hosts` to all `groups`, `chunk` hosts per host.massadd.
+        `HostGroup.hosts` and `Host.groups` are updated for the hosts the
+        server confirmed, which are returned.
+        """
+        groups = list(groups)
+        added = []
+        for part in chunks(hosts, chunk):
+            params = dict(
+                groups = [dict(groupid = group.id) for group in groups],
+                hosts = [dict(hostid = host.id) for host in part],
+            )
+            confirmed = C._confirmed(part, api.response('host.massadd', **params))
+            # Applied per chunk, so earlier chunks stay applied if a later one fails.
+            for host in confirmed:
+                for group in groups:
+                    if host._has('name'):
+                        group.hosts[host.name.val] = host
+                    if group._has('name'):
+                        host.groups[group.name.val] = group
+            added.extend(confirmed)
+        return added
+
+    @classmethod
+    def massremove(C, api, groups, hosts, chunk=500):
+        """
+        Remove all `hosts` from all `groups`, `chunk` hosts per
+        host.massremove.  `HostGroup.hosts` and `Host.groups` are updated
+        for the hosts the server confirmed, which are returned.
+        """
+        groups = list(groups)
+        removed = []
+        for part in chunks(hosts, chunk):
+            params = dict(
+                groupids = [group.id for group in groups],
+                hostids = [host.id for host in part],
+            )
+            confirmed = C._confirmed(part, api.response('host.massremove', **params))
+            for host in confirmed:
+                for group in groups:
+                    if host._has('name'):
+                        group.hosts.pop(host.name.val, None)
+                    if group._has('name'):
+                        host.groups.pop(group.name.val, None)
+            removed.extend(confirmed)
+        return removed
+
+    @staticmethod
+    def _confirmed(hosts, reply):
+        ids = set(reply['result'].get('hostids', []))
+        return [host for host in hosts if host.id in ids]
 
 
     def __repr__(I):
+        if not I._has('name'):
+            return super(HostGroup, I).__repr__()
         return "{}[{}]".format(I.__class__.__name__, I.name.val)
 
 
@@ -1,6 +1,26 @@
 
-from datetime import datetime
-from . import ApiObject
+from collections import namedtuple
+from datetime import datetime, timedelta
+from ..api import ApiException
+from . import ApiObject, chunks
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+History = namedtuple('History', ['ts', 'value'])
+History.__doc__ = """
+Columnar history: `ts` is an int64 array of nanoseconds since the epoch
+(from `clock` and `ns`) and `value` an array of the item's values.
+"""
+
+Trend = namedtuple('Trend', ['clock', 'num', 'min', 'avg', 'max'])
+Trend.__doc__ = """
+One hour of trends: `num` values were collected in the hour starting at
+`clock` (seconds since the epoch).
+"""
 
 
 class Item(ApiObject):
@@ -8,6 +28,8 @@ class Item(ApiObject):
     [Zabbix Item](https://www.zabbix.com/documentation/2.2/manual/api/reference/item/object)
     """
 
+    API_NAME = 'item'
+
     # See `value_type` property
     TYPE_FLOAT = 0
     TYPE_CHAR  = 1
@@ -15,35 +37,275 @@ class Item(ApiObject):
     TYPE_INT   = 3
     TYPE_TEXT  = 4
 
+    def process_refs(I, attrs):
+        I._host_list = None
+
+
     def hosts(I):
         """
-        List of `Hosts` with this item.
+        `ResultSet` of `Hosts` with this item.  The cached `Host` is used
+        when the api has one for this item's `hostid`, or the one loaded
+        by `prefetch`.
         """
-        return [Host(I._api, **host) for host in
-                I._api.response('host.get', itemids=I.id).get('result')]
+        if I._host_list is not None:
+            return ResultSet(I._host_list, Host)
+        cached = I._cached_hosts()
+        if cached is not None:
+            return cached
+        return I._hosts(I._api.response('host.get', **I._hosts_params()))
+
+    def _cached_hosts(I):
+        if I._api.cache is None or not I._has('hostid'):
+            return None
+        host = I._api.cache.get(Host, I.hostid.val)
+        if host is None:
+            return None
+        return ResultSet([host], Host)
+
+    @classmethod
+    def _prefetch(C, items, relation, chunk):
+        if relation != 'hosts':
+            return super(Item, C)._prefetch(items, relation, chunk)
+        api = items[0]._api
+        hostids = {}
+        unknown = {}
+        for item in items:
+            if item._has('hostid'):
+                hostids[item] = item.hostid.val
+            else:
+                unknown[str(item.id)] = item
+        for ids in chunks(unknown, chunk):
+            for row in api.response('item.get', output=['itemid', 'hostid'], itemids=ids).get('result'):
+                hostids[unknown[row['itemid']]] = row['hostid']
+        hosts = {}
+        for hostid in set(hostids.values()):
+            host = api.cache.get(Host, hostid) if api.cache is not None else None
+            if host is not None:
+                hosts[hostid] = host
+        for ids in chunks(set(hostids.values()) - set(hosts), chunk):
+            for row in api.response('host.get', output='extend', hostids=ids).get('result'):
+                host = Host._from_reply(api, row)
+                if api.cache is not None:
+                    api.cache.put(host)
+                hosts[host.id] = host
+        for item in items:
+            host = hosts.get(hostids.get(item))
+            item._host_list = [host] if host is not None else []
 
+    def _hosts_params(I):
+        return dict(itemids=I.id)
 
-    def get_history(I, ts_from=None, ts_to=None, limit=10):
+    def _hosts(I, reply):
+        hosts = ResultSet([Host._from_reply(I._api, host) for host in reply.get('result')], Host)
+        if I._api.cache is not None:
+            for host in hosts:
+                I._api.cache.put(host)
+        return hosts
+
+
+    def get_history(I, ts_from=None, ts_to=None, limit=10, columnar=False):
         """
         Return latest `limit` (ts, val) pairs from `ts_from` until `ts_to`.
+
+        With `columnar`, return a `History` of numpy arrays instead:
+        float64 values for float items, uint64 for unsigned ones.
+        """
+        params = I._history_params(ts_from, ts_to, limit)
+        return I._history(I._api.response('history.get', **params), columnar)
+
+    def get_trends(I, ts_from=None, ts_to=None, limit=None):
+        """
+        Return `Trend`s from `ts_from` until `ts_to`, oldest first.  Only
+        numeric items have trends.
         """
         params = dict(
             output = 'extend',
-            history = I.value_type.val,
             itemids = I.id,
-            limit = limit,
+        )
+        if limit:
+            params['limit'] = limit
+        if ts_from:
+            params['time_from'] = ts_from.strftime('%s')
+        if ts_to:
+            params['time_till'] = ts_to.strftime('%s')
+        rows = I._api.response('trend.get', **params).get('result')
+        trends = [Trend(
+            int(row['clock']),
+            int(row['num']),
+            I._typed_value(row['value_min']),
+            I._typed_value(row['value_avg']),
+            I._typed_value(row['value_max']),
+        ) for row in rows]
+        trends.sort()
+        return trends
+
+    def get_series(I, ts_from, ts_to=None, points=1000):
+        """
+        Return the values from `ts_from` until `ts_to`, from trends when
+        `uses_trends` says so (as a list of `Trend`s, from the oldest
+        trends kept) or raw history otherwise (as (ts, val) pairs, oldest
+        first).
+        """
+        if I.uses_trends(ts_from, ts_to, points):
+            kept = I._kept_since('trends', datetime.now())
+            return I.get_trends(max(ts_from, kept) if kept else ts_from, ts_to)
+        return list(I.iter_history(ts_from, ts_to))
+
+    def uses_trends(I, ts_from, ts_to=None, points=1000):
+        """
+        True if values from `ts_from` until `ts_to` are better read from
+        trends: the item is numeric, trends are still kept for part of the
+        range, and either its history is no longer kept that far back or
+        the range holds more than `points` raw values (and trends are kept
+        for all of it).
+        """
+        if I.value_type.val not in (I.TYPE_FLOAT, I.TYPE_INT):
+            return False
+        now = datetime.now()
+        ts_to = ts_to or now
+        history = I._kept_since('history', now)
+        trends = I._kept_since('trends', now)
+        if trends is not None and ts_to <= trends:
+            # Aged out of trends too: only history may hold something.
+            return False
+        if history is not None and ts_from < history:
+            return True
+        delay = I.delay.val if I._has('delay') else 0
+        if delay > 0 and (ts_to - ts_from).total_seconds() / delay > points:
+            return trends is None or ts_from >= trends
+        return False
+
+    def _kept_since(I, name, now):
+        """
+        Return the oldest time of which data is kept by retention property
+        `name` ('history' or 'trends', in days), or None if not loaded.
+        """
+        if not I._has(name):
+            return None
+        return now - timedelta(days=getattr(I, name).val)
+
+    @classmethod
+    def get_histories(C, api, items, ts_from=None, ts_to=None, chunk=100, columnar=False):
+        """
+        Return Map[Item -> history] of all values of `items` from
+        `ts_from` until `ts_to`, as `get_history` would.  Items are
+        grouped by `value_type`, as history.get only returns one type of
+        history per call, and fetched `chunk` items per request.
+        """
+        groups = {}
+        for item in items:
+            # Several objects may be the same item: each gets its history.
+            groups.setdefault(item.value_type.val, {}).setdefault(str(item.id), []).append(item)
+        histories = {}
+        for value_type, by_id in groups.items():
+            for ids in chunks(sorted(by_id), chunk):
+                params = C._history_query(value_type, ids, ts_from, ts_to)
+                rows = {}
+                for row in api.response('history.get', **params).get('result'):
+                    rows.setdefault(row['itemid'], []).append(row)
+                for id in ids:
+                    for item in by_id[id]:
+                        histories[item] = item._history(dict(result=rows.get(id, [])), columnar)
+        return histories
+
+
+    def iter_history(I, ts_from=None, ts_to=None, chunk=1000, columnar=False, per_second=None):
+        """
+        Generate (ts, val) pairs from `ts_from` until `ts_to`, oldest
+        first, fetching at most `chunk` rows per request.  With `columnar`,
+        generate a `History` block per request instead.
+
+        Paging is by `clock`: rows of a page's last second are held back
+        and read again as the start of the next page, so values sharing a
+        timestamp are neither lost nor repeated.  history.get can not sort
+        within a second, so a second holding a whole page is read at once:
+        up to `per_second` rows (default `10 * chunk`), more raise
+        `ApiException`.
+        """
+        per_second = per_second or 10 * chunk
+        params = I._history_params(None, ts_to, chunk)
+        params['sortorder'] = 'ASC'
+        cursor = int(ts_from.strftime('%s')) if ts_from else None
+        while True:
+            if cursor is not None:
+                params['time_from'] = cursor
+            rows = I._api.response('history.get', **params).get('result')
+            if len(rows) < chunk:
+                block = rows
+                cursor = None
+            else:
+                last = rows[-1]['clock']
+                block = [row for row in rows if row['clock'] != last]
+                if not block:
+                    # A whole page within one second: read that second at once.
+                    second = dict(params, time_from=last, time_till=last, limit=per_second + 1)
+                    block = I._api.response('history.get', **second).get('result')
+                    if len(block) > per_second:
+                        raise ApiException(
+                            ApiException.INVALID_VALUE,
+                            'too many values in one second',
+                            "item {}: more than {} at {}".format(I.id, per_second, last),
+                        )
+                    last = int(last) + 1
+                cursor = int(last)
+            # Sorted into a new list: replies may be shared (see `Api`).
+            block = sorted(block, key=lambda row: (int(row['clock']), int(row.get('ns', 0))))
+            if block:
+                if columnar:
+                    yield I._history_columns(block)
+                else:
+                    for row in block:
+                        yield row['clock'], I._typed_value(row['value'])
+            if cursor is None:
+                return
+
+    def _history_params(I, ts_from, ts_to, limit):
+        return I._history_query(I.value_type.val, I.id, ts_from, ts_to, limit)
+
+    @staticmethod
+    def _history_query(value_type, itemids, ts_from=None, ts_to=None, limit=None):
+        params = dict(
+            output = 'extend',
+            history = value_type,
+            itemids = itemids,
             sortfield = 'clock',
             sortorder = 'DESC',
         )
+        if limit:
+            params['limit'] = limit
         if ts_from:
             params['time_from'] = ts_from.strftime('%s')
         if ts_to:
             params['time_till'] = ts_to.strftime('%s')
-        return [(i['clock'], I._typed_value(i['value'])) for i in
-                I._api.response('history.get', **params).get('result')]
+        return params
+
+    def _history(I, reply, columnar=False):
+        if columnar:
+            return I._history_columns(reply.get('result'))
+        return [(i['clock'], I._typed_value(i['value'])) for i in reply.get('result')]
+
+    def _history_columns(I, rows):
+        """
+        Return `History` arrays converted in bulk from history.get `rows`.
+        """
+        if numpy is None:
+            raise ImportError('columnar history requires numpy')
+        ts = numpy.array([row['clock'] for row in rows]).astype(numpy.int64)
+        ts *= 1000000000
+        ts += numpy.array([row.get('ns', '0') for row in rows]).astype(numpy.int64)
+        values = [row['value'] for row in rows]
+        if I.value_type.val == I.TYPE_FLOAT:
+            values = numpy.array(values).astype(numpy.float64)
+        elif I.value_type.val == I.TYPE_INT:
+            values = numpy.array(values).astype(numpy.uint64)
+        else:
+            values = numpy.array(values, dtype=object)
+        return History(ts, values)
 
 
     def __repr__(I):
+        if not I._has('key_'):
+            return super(Item, I).__repr__()
         return "{}[{}]".format(I.__class__.__name__, I.key_.val)
 
 
@@ -305,3 +567,4 @@ class Item(ApiObject):
 
 # These import down here to work around circular imports.
 from .host import Host
+from .resultset import ResultSet
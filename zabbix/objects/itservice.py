@@ -7,6 +7,8 @@ class ItService(ApiObject):
     [Zabbix IT Service](https://www.zabbix.com/documentation/2.2/manual/api/reference/service/object)
     """
 
+    API_NAME = 'service'
+
     PROPS = dict(
         serviceid = dict(
             doc = "ID of the IT service.",
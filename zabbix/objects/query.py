@@ -0,0 +1,142 @@
+"""
+Query builder over `ApiObject` classes.
+"""
+
+from datetime import datetime
+from ..api import ApiException
+from .resultset import ResultSet
+
+__all__ = [
+    'Query',
+]
+
+
+class Query(object):
+    """
+    A `<type>.get` call built up step by step, ie::
+
+        Item.query(api).fields('key_', 'lastvalue').where(hostids=host.id).all()
+        Host.query(api).search(name='web').filter(status=0).count()
+
+    Property names are checked against the class's `PROPS`.  Each step
+    returns a new `Query`, so partial queries can be reused.  Objects
+    only have the properties asked for with `fields`.
+    """
+
+    def __init__(I, C, api, params=None):
+        I._C = C
+        I._api = api
+        I._params = params or dict(output='extend')
+
+
+    def fields(I, *names):
+        """
+        Only return these properties (and the id).
+        """
+        I._check(names)
+        output = [I._C._ID] + [name for name in names if name != I._C._ID]
+        return I._with(output=output)
+
+    def filter(I, **props):
+        """
+        Only return objects whose properties exactly match `props`.  A
+        list of values matches any of them.
+        """
+        return I._merge('filter', props)
+
+    def search(I, **props):
+        """
+        Only return objects whose properties contain the `props` strings.
+        """
+        return I._merge('search', props)
+
+    def where(I, **params):
+        """
+        Add other `<type>.get` parameters, ie: `hostids`, `groupids`.
+        """
+        return I._with(**params)
+
+    def limit(I, limit):
+        """
+        Return at most `limit` objects.
+        """
+        return I._with(limit=limit)
+
+    def sort(I, *names, **kwargs):
+        """
+        Sort by properties `names`, descending if `desc=True`.
+        """
+        I._check(names)
+        return I._with(
+            sortfield = list(names),
+            sortorder = 'DESC' if kwargs.get('desc') else 'ASC',
+        )
+
+
+    def all(I):
+        """
+        `ResultSet` of matching objects.
+        """
+        api = I._api
+        return ResultSet([I._C._from_reply(api, row) for row in
+                          api.response(I.method, **I._params).get('result')], I._C)
+
+    def first(I):
+        """
+        The first matching object, or None.
+        """
+        result = I.limit(1).all()
+        return result[0] if result else None
+
+    def count(I):
+        """
+        Number of matching objects, counted by the server.
+        """
+        params = dict(I._params, countOutput=True)
+        params.pop('output', None)
+        return int(I._api.response(I.method, **params).get('result'))
+
+    def __iter__(I):
+        return iter(I.all())
+
+    @property
+    def method(I):
+        return I._C.API_NAME + '.get'
+
+    @property
+    def params(I):
+        """
+        Copy of the parameters to be sent.
+        """
+        return dict(I._params)
+
+    def __repr__(I):
+        return "{}[{}: {}]".format(I.__class__.__name__, I.method, I._params)
+
+
+    def _with(I, **params):
+        return Query(I._C, I._api, dict(I._params, **params))
+
+    def _merge(I, key, props):
+        I._check(props)
+        merged = dict(I._params.get(key, {}))
+        for name, val in props.items():
+            merged[name] = I._dump(val)
+        return I._with(**{key: merged})
+
+    def _check(I, names):
+        for name in names:
+            if name not in I._C.PROPS:
+                raise ApiException(
+                    ApiException.INVALID_VALUE,
+                    'unknown property',
+                    "{}: {}".format(I._C.__name__, name),
+                )
+
+    @staticmethod
+    def _dump(val):
+        if isinstance(val, (list, tuple, set)):
+            return [Query._dump(v) for v in val]
+        if isinstance(val, datetime):
+            return val.strftime('%s')
+        return val
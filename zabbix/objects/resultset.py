@@ -0,0 +1,211 @@
+"""
+Lists of `ApiObject`s with column-wise access.
+"""
+
+from html import escape
+from itertools import compress
+from operator import itemgetter
+from ..api import ApiException
+from . import MISSING
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+__all__ = [
+    'ResultMap',
+    'ResultSet',
+]
+
+
+class ResultSet(list):
+    """
+    List of objects of class `C` (the class of the first one by default)
+    returned by bulk lookups, with their properties also available as
+    columns::
+
+        hosts = Host.query(api).all()
+        hosts.column('name')
+        hosts.filter(available=2).order_by('name')
+        hosts.filter(hosts.array('available') == 2)
+        hosts.group_by('status')
+        hosts.to_dataframe()
+
+    Columns hold None where a property was not loaded.  In IPython only
+    one page of `HTML_ROWS` rows is rendered, see `html`.
+    """
+
+    HTML_ROWS = 50
+    HTML_WIDTH = 40  # characters shown of each value
+
+    def __init__(I, objs=(), C=None):
+        list.__init__(I, objs)
+        I.C = C if C is not None or not I else I[0].__class__
+
+
+    def column(I, name):
+        """
+        List of the values of property `name`.
+        """
+        if not I:
+            return []
+        return [None if val is MISSING else val for val in I._column(I._spec(name).index)]
+
+    def array(I, name):
+        """
+        numpy array of the values of property `name`.
+        """
+        if numpy is None:
+            raise ImportError('ResultSet.array requires numpy')
+        return numpy.array(I.column(name))
+
+    def filter(I, mask=None, **props):
+        """
+        ResultSet of the objects whose `mask` entry is true (any sequence
+        of booleans as long as this one, ie: a numpy comparison), and
+        whose properties equal `props`.  A list of values matches any of
+        them.
+        """
+        if not I:
+            return ResultSet([], I.C)
+        keep = [True] * len(I) if mask is None else [bool(m) for m in mask]
+        if len(keep) != len(I):
+            raise ApiException(
+                ApiException.INVALID_VALUE,
+                'invalid mask',
+                "{} values for {} objects".format(len(keep), len(I)),
+            )
+        for name, val in props.items():
+            spec = I._spec(name)
+            if not isinstance(val, (list, tuple, set)):
+                val = [val]
+            vals = set(spec.coerce(v) for v in val)
+            keep = [k and m for k, m in zip(keep, map(vals.__contains__, I._column(spec.index)))]
+        return ResultSet(compress(I, keep), I.C)
+
+    def order_by(I, *names, **kwargs):
+        """
+        ResultSet sorted by properties `names`, descending if `desc=True`.
+        Objects without a value sort first.
+        """
+        if not I or not names:
+            return ResultSet(I, I.C)
+        desc = kwargs.get('desc', False)
+        # A key column per property.  The flag sorts missing values first
+        # either way; the values themselves only compare between objects
+        # having one.
+        columns = [[((val is MISSING or val is None) == desc, None if val is MISSING else val)
+                    for val in I._column(I._spec(name).index)] for name in names]
+        keys = list(zip(*columns))
+        order = sorted(range(len(I)), key=keys.__getitem__, reverse=desc)
+        return ResultSet(map(I.__getitem__, order), I.C)
+
+    def group_by(I, name):
+        """
+        Map[value -> ResultSet] of the objects by their property `name`.
+        """
+        groups = {}
+        for obj, val in zip(I, I.column(name)):
+            groups.setdefault(val, []).append(obj)
+        return dict((val, ResultSet(objs, I.C)) for val, objs in groups.items())
+
+    def to_dataframe(I, names=None):
+        """
+        pandas DataFrame with a column per property (default all of
+        `C.PROPS`), indexed by id.
+        """
+        if pandas is None:
+            raise ImportError('ResultSet.to_dataframe requires pandas')
+        names = sorted(I.C.PROPS) if names is None and I.C is not None else list(names or ())
+        ids = [obj.id for obj in I]
+        return pandas.DataFrame(dict((name, I.column(name)) for name in names), index=ids, columns=names)
+
+
+    def html(I, page=0, size=None):
+        """
+        HTML table of rows `page * size` to `(page + 1) * size`, with
+        the properties loaded for these rows.
+        """
+        size = size or I.HTML_ROWS
+        rows = I[page * size:(page + 1) * size]
+        name = I.C.__name__ if I.C is not None else 'object'
+        caption = "{} {}s".format(len(I), name)
+        if len(rows) < len(I):
+            caption += ", rows {}-{}".format(page * size + 1, page * size + len(rows))
+        specs = []
+        if rows:
+            loaded = set()
+            for obj in rows:
+                loaded.update(name for name, spec in I.C._SPECS.items() if obj._vals[spec.index] is not MISSING)
+            specs = [I.C._SPECS[name] for name in sorted(loaded)]
+        html = ['<table><caption>{}</caption><thead><tr>'.format(caption)]
+        html.extend('<th>{}</th>'.format(spec.name) for spec in specs)
+        html.append('</tr></thead><tbody>')
+        for obj in rows:
+            html.append('<tr>')
+            for spec in specs:
+                html.append('<td>{}</td>'.format(I._cell(obj._vals[spec.index])))
+            html.append('</tr>')
+        html.append('</tbody></table>')
+        return ''.join(html)
+
+    def _repr_html_(I):
+        return I.html()
+
+    def __getitem__(I, index):
+        if isinstance(index, slice):
+            return ResultSet(list.__getitem__(I, index), I.C)
+        return list.__getitem__(I, index)
+
+
+    def _cell(I, val):
+        if val is MISSING or val is None:
+            return ''
+        text = str(val)
+        if len(text) > I.HTML_WIDTH:
+            text = text[:I.HTML_WIDTH - 1] + '…'
+        return escape(text)
+
+    def _column(I, index):
+        """
+        Iterator over the raw values (MISSING where not loaded) at `index`.
+        """
+        return map(itemgetter(index), (obj._vals for obj in I))
+
+    def _spec(I, name):
+        spec = I.C._SPECS.get(name)
+        if spec is None:
+            raise ApiException(
+                ApiException.INVALID_VALUE,
+                'unknown property',
+                "{}: {}".format(I.C.__name__, name),
+            )
+        return spec
+
+
+class ResultMap(dict):
+    """
+    Map[key -> object of class `C`, or None if not found] returned by
+    bulk lookups by key, ie: `Host.by_names`, whose objects are also
+    available as a `ResultSet`::
+
+        hosts = Host.by_names(api, names)
+        hosts['web1']
+        hosts.found().filter(status=0).column('name')
+    """
+
+    def __init__(I, pairs=(), C=None):
+        dict.__init__(I, pairs)
+        I.C = C
+
+    def found(I):
+        """
+        `ResultSet` of the objects found, in the order of their keys.
+        """
+        return ResultSet([obj for obj in I.values() if obj is not None], I.C)
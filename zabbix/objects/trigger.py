@@ -1,13 +1,21 @@
 
+from collections import namedtuple
 from datetime import datetime
 from . import ApiObject
 
+__all__ = [
+    'Trigger',
+    'ProblemTracker',
+]
+
 
 class Trigger(ApiObject):
     """
     [Zabbix Trigger](https://www.zabbix.com/documentation/2.2/manual/api/reference/trigger/object)
     """
 
+    API_NAME = 'trigger'
+
     PROPS = dict(
         triggerid = dict(
             doc = "ID of the trigger.",
@@ -95,3 +103,84 @@ class Trigger(ApiObject):
             },
         ),
     )
+
+
+Changes = namedtuple('Changes', ['added', 'resolved', 'changed'])
+Changes.__doc__ = """
+Lists of `Trigger`s that went into problem state, went back to OK, or
+changed while in problem state, since the previous poll.
+"""
+
+
+class ProblemTracker(object):
+    """
+    Local set of `Trigger`s in problem state, kept current by polling
+    only what changed::
+
+        tracker = ProblemTracker(api, groupids=group.id)
+        while True:
+            changes = tracker.poll()
+            ...
+            time.sleep(30)
+
+    The first poll loads every trigger in problem state.  Later polls ask
+    for triggers whose state changed since the highest `lastchange` seen
+    (`lastChangeSince`, from the second before it since the server only
+    returns later changes), without a value filter so that resolved
+    triggers are seen too.  Triggers returned again are skipped unless
+    their state differs.  Extra `params` are passed to every trigger.get.
+    """
+
+    def __init__(I, api, **params):
+        I._api = api
+        I._params = params
+        I._since = None
+        I._seen = {}
+        I.problems = {}
+
+
+    def poll(I):
+        """
+        Fetch changes from the server, apply them to `problems` (Map[id ->
+        Trigger]) and return them as `Changes`.
+        """
+        params = dict(I._params, output='extend')
+        if I._since is None:
+            params['filter'] = dict(params.get('filter', {}), value=1)
+            I._since = I._last_change()
+        else:
+            params['lastChangeSince'] = I._since - 1
+        changes = Changes([], [], [])
+        for row in I._api.response('trigger.get', **params).get('result'):
+            id = row['triggerid']
+            lastchange = int(row.get('lastchange') or 0)
+            I._since = max(I._since, lastchange)
+            state = (lastchange, row.get('value'), row.get('priority'), row.get('description'))
+            if I._seen.get(id) == state:
+                continue
+            trigger = Trigger._from_reply(I._api, row)
+            if trigger.value.val == 1:
+                if id in I.problems:
+                    changes.changed.append(trigger)
+                else:
+                    changes.added.append(trigger)
+                I.problems[id] = trigger
+                I._seen[id] = state
+            elif id in I.problems:
+                del I.problems[id]
+                del I._seen[id]
+                changes.resolved.append(trigger)
+        return changes
+
+    def _last_change(I):
+        """
+        Highest `lastchange` of all tracked triggers, problem or not.
+        """
+        params = dict(I._params,
+            output = ['triggerid', 'lastchange'],
+            sortfield = 'lastchange',
+            sortorder = 'DESC',
+            limit = 1,
+        )
+        result = I._api.response('trigger.get', **params).get('result')
+        return int(result[0]['lastchange']) if result else 0
@@ -0,0 +1,183 @@
+"""
+Persistent local storage of item history.
+"""
+
+import sqlite3
+import time
+from datetime import datetime
+
+__all__ = [
+    'HistoryStore',
+]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    itemid TEXT NOT NULL,
+    clock INTEGER NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS history_item_clock ON history (itemid, clock);
+CREATE TABLE IF NOT EXISTS ranges (
+    itemid TEXT NOT NULL,
+    ts_from INTEGER NOT NULL,
+    ts_to INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ranges_item ON ranges (itemid, ts_from);
+CREATE TABLE IF NOT EXISTS held (
+    bytes INTEGER NOT NULL
+);
+INSERT INTO held SELECT COALESCE(SUM({row}), 0) FROM history WHERE NOT EXISTS (SELECT 1 FROM held);
+CREATE TRIGGER IF NOT EXISTS history_insert AFTER INSERT ON history BEGIN
+    UPDATE held SET bytes = bytes + {new};
+END;
+CREATE TRIGGER IF NOT EXISTS history_delete AFTER DELETE ON history BEGIN
+    UPDATE held SET bytes = bytes - {old};
+END;
+"""
+
+# Bytes counted for a row of history.
+ROW_BYTES = "(LENGTH({0}itemid) + 8 + LENGTH(CAST({0}value AS BLOB)))"
+SCHEMA = SCHEMA.format(row=ROW_BYTES.format(''), new=ROW_BYTES.format('NEW.'), old=ROW_BYTES.format('OLD.'))
+
+# Largest integer SQLite can store; bigger unsigned values are kept as text.
+MAX_INT = 2**63 - 1
+
+
+class HistoryStore(object):
+    """
+    SQLite file of item history, keyed by itemid.  For each item the
+    time ranges already held are recorded, so only missing gaps (usually
+    the recent tail) are fetched from the server::
+
+        store = HistoryStore('history.db', max_bytes=1 << 30)
+        store.get_history(item, datetime(2014, 1, 1))
+
+    Values newer than `lag` seconds may still change on the server, so
+    they are fetched but not recorded as held.  Once more than
+    `max_bytes` of history is held (see `size`), the oldest ranges are
+    evicted.
+    """
+
+    def __init__(I, path, max_bytes=None, lag=60, chunk=1000, clock=time.time):
+        I.max_bytes = max_bytes
+        I.lag = lag
+        I.chunk = chunk
+        I._clock = clock
+        I._db = sqlite3.connect(path)
+        I._db.executescript(SCHEMA)
+
+
+    def get_history(I, item, ts_from, ts_to=None):
+        """
+        Return (ts, val) pairs of `item` from `ts_from` until `ts_to`
+        (default now), oldest first, as `Item.iter_history` would.
+        """
+        lo = int(ts_from.strftime('%s'))
+        hi = int(ts_to.strftime('%s')) if ts_to else int(I._clock())
+        for gap in I.missing(item, lo, hi):
+            I._fetch(item, *gap)
+        rows = I._db.execute(
+            'SELECT clock, value FROM history WHERE itemid = ? AND clock BETWEEN ? AND ? ORDER BY clock, rowid',
+            (str(item.id), lo, hi),
+        ).fetchall()
+        I._evict()
+        return [(str(clock), item._typed_value(val)) for clock, val in rows]
+
+    def ranges(I, item):
+        """
+        Return the (ts_from, ts_to) ranges of `item` held, in seconds
+        since the epoch, inclusive.
+        """
+        return I._db.execute(
+            'SELECT ts_from, ts_to FROM ranges WHERE itemid = ? ORDER BY ts_from',
+            (str(item.id),),
+        ).fetchall()
+
+    def missing(I, item, lo, hi):
+        """
+        Return the (ts_from, ts_to) gaps of `item` between `lo` and `hi`.
+        """
+        gaps = []
+        for held_lo, held_hi in I.ranges(item):
+            if held_hi < lo:
+                continue
+            if held_lo > hi:
+                break
+            if held_lo > lo:
+                gaps.append((lo, held_lo - 1))
+            lo = max(lo, held_hi + 1)
+        if lo <= hi:
+            gaps.append((lo, hi))
+        return gaps
+
+    def invalidate(I, item=None):
+        """
+        Forget everything held for `item`, or for all items.
+        """
+        with I._db:
+            if item is None:
+                I._db.execute('DELETE FROM history')
+                I._db.execute('DELETE FROM ranges')
+            else:
+                I._db.execute('DELETE FROM history WHERE itemid = ?', (str(item.id),))
+                I._db.execute('DELETE FROM ranges WHERE itemid = ?', (str(item.id),))
+
+    def size(I):
+        """
+        Bytes of history held: the stored itemids, clocks and values,
+        counted as rows are inserted and deleted.  Unlike the pages of
+        the file, this goes down as soon as rows are deleted.
+        """
+        return I._db.execute('SELECT bytes FROM held').fetchone()[0]
+
+    def close(I):
+        I._db.close()
+
+
+    def _fetch(I, item, lo, hi):
+        """
+        Replace what is held of `item` between `lo` and `hi` with values
+        from the server, and record the range as held.
+        """
+        id = str(item.id)
+        with I._db:
+            I._db.execute('DELETE FROM history WHERE itemid = ? AND clock BETWEEN ? AND ?', (id, lo, hi))
+            rows = item.iter_history(datetime.fromtimestamp(lo), datetime.fromtimestamp(hi), chunk=I.chunk)
+            I._db.executemany(
+                'INSERT INTO history (itemid, clock, value) VALUES (?, ?, ?)',
+                ((id, int(clock), val if not isinstance(val, int) or val <= MAX_INT else str(val))
+                 for clock, val in rows),
+            )
+            hi = min(hi, int(I._clock()) - I.lag)
+            if lo <= hi:
+                I._add_range(id, lo, hi)
+
+    def _add_range(I, id, lo, hi):
+        ranges = I._db.execute(
+            'SELECT ts_from, ts_to FROM ranges WHERE itemid = ? ORDER BY ts_from', (id,)).fetchall()
+        merged = []
+        for r_lo, r_hi in sorted(ranges + [(lo, hi)]):
+            if merged and r_lo <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], r_hi))
+            else:
+                merged.append((r_lo, r_hi))
+        I._db.execute('DELETE FROM ranges WHERE itemid = ?', (id,))
+        I._db.executemany('INSERT INTO ranges VALUES (?, ?, ?)', [(id, r_lo, r_hi) for r_lo, r_hi in merged])
+
+    def _evict(I):
+        """
+        Drop the oldest ranges until no more than `max_bytes` are held, or
+        no range is left.
+        """
+        if I.max_bytes is None:
+            return
+        while I.size() > I.max_bytes:
+            oldest = I._db.execute(
+                'SELECT rowid, itemid, ts_from, ts_to FROM ranges ORDER BY ts_from LIMIT 1').fetchone()
+            if oldest is None:
+                return
+            rowid, id, lo, hi = oldest
+            with I._db:
+                I._db.execute('DELETE FROM history WHERE itemid = ? AND clock BETWEEN ? AND ?', (id, lo, hi))
+                I._db.execute('DELETE FROM ranges WHERE rowid = ?', (rowid,))